@@ -2,18 +2,23 @@ import streamlit as st
 import pandas as pd
 import sqlite3
 import os
+import uuid
 from datetime import datetime, timedelta
 
 # Import application modules
 import auth
+import backup
 import database
 import dashboard
+import explorer
 import gatebook
 import ledger
 import balance_sheet
 import party_management
 import item_management
 import inventory
+import metrics
+import tenants
 import utils
 
 # Page configuration
@@ -24,9 +29,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize the database if it doesn't exist
-if not os.path.exists('business_management.db'):
-    database.initialize_database()
+# Back up every database in the background (started once per process)
+backup.scheduler.start()
+
+# Serve Prometheus metrics for this process (started once per process)
+metrics.server.start()
 
 # Initialize session state
 if 'logged_in' not in st.session_state:
@@ -38,14 +45,99 @@ if 'username' not in st.session_state:
 if 'current_page' not in st.session_state:
     st.session_state.current_page = "Dashboard"
 
+if 'company' not in st.session_state:
+    st.session_state.company = None
+
+if 'metrics_session' not in st.session_state:
+    st.session_state.metrics_session = uuid.uuid4().hex
+metrics.touch_session(st.session_state.metrics_session)
+
+# Route this run's queries to the selected company's database
+# (each database is created and initialized the first time it is opened)
+tenants.set_current_company(st.session_state.company)
+
 # Login page
 if not st.session_state.logged_in:
-    auth.show_login_page()
+    with metrics.timed("page_requests_total", "page_duration_seconds", "page_errors_total", page="Login"):
+        auth.show_login_page()
 else:
+    # Once companies are registered, users only work in the companies assigned to
+    # them; the default database holds the registry and is not a fallback
+    companies = tenants.get_user_companies(st.session_state.username)
+    if not companies and st.session_state.username != "admin" and tenants.get_companies():
+        st.title(f"Welcome, {st.session_state.username}")
+        st.warning("No company has been assigned to you yet. Ask an administrator for access.")
+        if st.button("Logout", key="unassigned_logout"):
+            st.session_state.logged_in = False
+            st.session_state.username = ""
+            st.session_state.company = None
+            st.rerun()
+        st.stop()
+    
     # Navigation sidebar with improved styling
     with st.sidebar:
         st.title(f"Welcome, {st.session_state.username}")
         
+        # Company selector (only shown when companies are registered)
+        if companies:
+            company_names = {db_file: name for name, db_file in companies}
+            company_options = list(company_names)
+            if st.session_state.username == "admin":
+                company_names[None] = "Default Company"
+                company_options.insert(0, None)
+            
+            if st.session_state.company not in company_options:
+                st.session_state.company = company_options[0]
+                tenants.set_current_company(st.session_state.company)
+            
+            selected_company = st.selectbox(
+                "Company",
+                options=company_options,
+                index=company_options.index(st.session_state.company),
+                format_func=lambda x: company_names[x]
+            )
+            if selected_company != st.session_state.company:
+                st.session_state.company = selected_company
+                st.rerun()
+        
+        # Admin can register new companies, each with its own database file
+        if st.session_state.username == "admin":
+            with st.expander("Add Company"):
+                new_company = st.text_input("Company Name", key="new_company_name")
+                if st.button("Create Company", key="create_company"):
+                    if not new_company:
+                        st.error("Company name is required")
+                    else:
+                        success, message = tenants.add_company(new_company, st.session_state.username)
+                        if success:
+                            st.success(message)
+                        else:
+                            st.error(message)
+            
+            # Non-admin users only see the companies they are assigned to
+            with st.expander("Company Access"):
+                users = tenants.get_assignable_users()
+                all_companies = dict(tenants.get_companies())
+                if not users or not all_companies:
+                    st.info("Register users and companies to assign access")
+                else:
+                    access_user = st.selectbox("User", options=users, key="access_user")
+                    assigned = [company_id for company_id in tenants.get_company_ids(access_user)
+                                if company_id in all_companies]
+                    access_companies = st.multiselect(
+                        "Companies",
+                        options=list(all_companies),
+                        default=assigned,
+                        format_func=lambda x: all_companies[x],
+                        key=f"access_companies_{access_user}"
+                    )
+                    if st.button("Save Access", key="save_access"):
+                        success, message = tenants.set_user_companies(access_user, access_companies)
+                        if success:
+                            st.success(message)
+                        else:
+                            st.error(message)
+        
         # Add some space
         st.write("---")
         
@@ -57,6 +149,7 @@ else:
             "Party Ledger": "👥",
             "Item Ledger": "📦",
             "Balance Sheet": "💰",
+            "Cube Explorer": "🧊",
             "Party Management": "🤝",
             "Item Management": "🏷️",
             "Inventory Management": "🗃️"
@@ -135,34 +228,40 @@ else:
         if st.button("🚪 Logout", key="logout"):
             st.session_state.logged_in = False
             st.session_state.username = ""
+            st.session_state.company = None
             st.rerun()
     
     # Main content - using session state to determine current page
     current_page = st.session_state.current_page
     
-    if current_page == "Dashboard":
-        dashboard.show_dashboard()
-    
-    elif current_page == "Gatebook Entry":
-        gatebook.show_gatebook_entry()
-    
-    elif current_page == "Ledger":
-        ledger.show_general_ledger()
-    
-    elif current_page == "Party Ledger":
-        ledger.show_party_ledger()
-    
-    elif current_page == "Item Ledger":
-        ledger.show_item_ledger()
-    
-    elif current_page == "Balance Sheet":
-        balance_sheet.show_balance_sheet()
-    
-    elif current_page == "Party Management":
-        party_management.show_party_management()
-    
-    elif current_page == "Item Management":
-        item_management.show_item_management()
-    
-    elif current_page == "Inventory Management":
-        inventory.show_inventory_management()
+    # Count and time each page render for the metrics endpoint
+    with metrics.timed("page_requests_total", "page_duration_seconds", "page_errors_total", page=current_page):
+        if current_page == "Dashboard":
+            dashboard.show_dashboard()
+        
+        elif current_page == "Gatebook Entry":
+            gatebook.show_gatebook_entry()
+        
+        elif current_page == "Ledger":
+            ledger.show_general_ledger()
+        
+        elif current_page == "Party Ledger":
+            ledger.show_party_ledger()
+        
+        elif current_page == "Item Ledger":
+            ledger.show_item_ledger()
+        
+        elif current_page == "Balance Sheet":
+            balance_sheet.show_balance_sheet()
+        
+        elif current_page == "Cube Explorer":
+            explorer.show_cube_explorer()
+        
+        elif current_page == "Party Management":
+            party_management.show_party_management()
+        
+        elif current_page == "Item Management":
+            item_management.show_item_management()
+        
+        elif current_page == "Inventory Management":
+            inventory.show_inventory_management()
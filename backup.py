@@ -0,0 +1,252 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import snapshot
+import tenants
+
+# Where compressed backups and the backup log are written
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+
+# Seconds between backups of each database (0 disables the scheduler)
+BACKUP_INTERVAL = int(os.environ.get("BACKUP_INTERVAL", "86400"))
+
+# Pages copied per backup step and seconds slept between steps, so writers are never held up for long
+BACKUP_PAGES = int(os.environ.get("BACKUP_PAGES", "64"))
+BACKUP_PAUSE = float(os.environ.get("BACKUP_PAUSE", "0.02"))
+
+# Retention: the newest backups, plus the newest backup of each of the last few weeks
+BACKUP_KEEP_LAST = int(os.environ.get("BACKUP_KEEP_LAST", "7"))
+BACKUP_KEEP_WEEKLY = int(os.environ.get("BACKUP_KEEP_WEEKLY", "8"))
+
+# Seconds before a failed backup is tried again, doubling after each further failure up to the interval
+BACKUP_RETRY = int(os.environ.get("BACKUP_RETRY", "300"))
+
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+LOG_FILE = "backup_log.jsonl"
+
+logger = logging.getLogger(__name__)
+
+def database_label(company_file=None):
+    """Folder and file prefix used for a database's backups"""
+    if not company_file:
+        return "_default"
+    return os.path.splitext(company_file)[0]
+
+def list_databases():
+    """Company files of every database to back up (None is the default database)"""
+    if not os.path.exists(tenants.company_path()):
+        return []
+
+    conn = tenants.get_registry_connection()
+    try:
+        rows = conn.execute("SELECT db_file FROM companies ORDER BY db_file").fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    return [None] + [db_file for (db_file,) in rows]
+
+def list_backups(label, backup_dir=BACKUP_DIR):
+    """A database's backup files as (taken_at, path), newest first"""
+    folder = os.path.join(backup_dir, label)
+    if not os.path.isdir(folder):
+        return []
+
+    backups = []
+    prefix = f"{label}-"
+    for file_name in os.listdir(folder):
+        if not (file_name.startswith(prefix) and file_name.endswith(".db.gz")):
+            continue
+        try:
+            taken_at = datetime.strptime(file_name[len(prefix):-len(".db.gz")], TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+        backups.append((taken_at, os.path.join(folder, file_name)))
+    return sorted(backups, reverse=True)
+
+def expired_backups(backups, keep_last=BACKUP_KEEP_LAST, keep_weekly=BACKUP_KEEP_WEEKLY):
+    """Backups (newest first) that fall outside the retention rules"""
+    keep = {path for _, path in backups[:keep_last]}
+
+    weeks = set()
+    for taken_at, path in backups:
+        week = taken_at.isocalendar()[:2]
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.add(week)
+            keep.add(path)
+
+    return [path for _, path in backups if path not in keep]
+
+def backup_database(company_file=None, backup_dir=BACKUP_DIR, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """Take a throttled online backup of one database, compress it and apply retention"""
+    source_path = tenants.company_path(company_file)
+    label = database_label(company_file)
+    folder = os.path.join(backup_dir, label)
+    os.makedirs(folder, exist_ok=True)
+
+    started = time.time()
+    backup_path = os.path.join(folder, f"{label}-{datetime.fromtimestamp(started).strftime(TIMESTAMP_FORMAT)}.db.gz")
+    copy_path = backup_path + ".copy"
+    record = {
+        "database": source_path,
+        "file": backup_path,
+        "started_at": datetime.fromtimestamp(started).isoformat(timespec="seconds")
+    }
+
+    try:
+        # Copy with the backup API so the result is consistent even while gatebook entries are saved
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(copy_path)
+        try:
+            snapshot.copy_database(source, target, pages=pages, pause=pause, max_restarts=10)
+            check = target.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"backup copy failed quick_check: {check}")
+
+        # Compress next to the final name, then move it into place in one step
+        with open(copy_path, "rb") as raw, gzip.open(backup_path + ".tmp", "wb", compresslevel=6) as compressed:
+            shutil.copyfileobj(raw, compressed, 1024 * 1024)
+        os.replace(backup_path + ".tmp", backup_path)
+
+        record.update(
+            status="ok",
+            size=os.path.getsize(copy_path),
+            compressed_size=os.path.getsize(backup_path)
+        )
+    except (OSError, sqlite3.Error) as e:
+        record.update(status="failed", error=str(e))
+    finally:
+        for leftover in (copy_path, backup_path + ".tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    record["duration"] = round(time.time() - started, 3)
+
+    # Only prune once a new backup exists
+    if record["status"] == "ok":
+        removed = expired_backups(list_backups(label, backup_dir))
+        for path in removed:
+            os.remove(path)
+        record["removed"] = len(removed)
+
+    write_log(record, backup_dir)
+    return record
+
+def write_log(record, backup_dir=BACKUP_DIR):
+    """Append a backup result to the backup log"""
+    with open(os.path.join(backup_dir, LOG_FILE), "a") as log:
+        log.write(json.dumps(record) + "\n")
+
+def read_log(backup_dir=BACKUP_DIR, limit=100):
+    """Most recent backup results, newest first"""
+    path = os.path.join(backup_dir, LOG_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as log:
+        lines = log.readlines()[-limit:]
+    return [json.loads(line) for line in reversed(lines)]
+
+class BackupScheduler:
+    """Backs up every database on a daemon thread once its latest backup is older than the interval"""
+
+    def __init__(self, interval=BACKUP_INTERVAL, backup_dir=BACKUP_DIR, retry=BACKUP_RETRY):
+        self.interval = interval
+        self.backup_dir = backup_dir
+        self.retry = retry
+        self.last_results = {}
+        self.failures = {}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def retry_delay(self, failures):
+        """Seconds to wait after a number of consecutive failed backups"""
+        return min(self.retry * 2 ** (failures - 1), self.interval)
+
+    def due(self, company_file):
+        """Whether a database has no backup newer than the interval and is not waiting to retry"""
+        # A failed backup leaves no file, so without this it would be retried on every pass
+        failed = self.failures.get(company_file)
+        if failed is not None:
+            failures, attempted_at = failed
+            if time.time() - attempted_at < self.retry_delay(failures):
+                return False
+
+        backups = list_backups(database_label(company_file), self.backup_dir)
+        if not backups:
+            return True
+        return (datetime.now() - backups[0][0]).total_seconds() >= self.interval
+
+    def run_once(self):
+        """Back up every database that is due"""
+        for company_file in list_databases():
+            if self._stop.is_set():
+                return
+            try:
+                if not os.path.exists(tenants.company_path(company_file)) or not self.due(company_file):
+                    continue
+                record = backup_database(company_file, self.backup_dir)
+            except Exception as e:
+                # Writing the log or pruning old backups can fail outside the backup's own error handling
+                logger.exception("Backup of %s failed", tenants.company_path(company_file))
+                record = {"database": tenants.company_path(company_file), "status": "failed", "error": str(e)}
+            self.last_results[record["database"]] = record
+
+            if record["status"] == "ok":
+                self.failures.pop(company_file, None)
+            else:
+                failures = self.failures.get(company_file, (0, None))[0] + 1
+                self.failures[company_file] = (failures, time.time())
+                logger.warning("Backup of %s failed (%s); retrying in %d s",
+                               record["database"], record.get("error"), self.retry_delay(failures))
+
+    def start(self):
+        """Start the scheduler thread, unless disabled or already started"""
+        # Every script run calls this, and Streamlit runs scripts on several threads
+        with self.lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # Keep the thread alive, so a passing problem does not end backups for good
+                logger.exception("Backup scheduler pass failed")
+            self._stop.wait(min(self.interval, 60))
+
+    def stop(self):
+        """Stop the scheduler thread after the current backup"""
+        self._stop.set()
+
+scheduler = BackupScheduler()
+
+def main():
+    """Back up every database now"""
+    for company_file in list_databases():
+        if not os.path.exists(tenants.company_path(company_file)):
+            continue
+        record = backup_database(company_file)
+        if record["status"] == "ok":
+            print(f"{record['database']}: {record['size'] / 1e6:.1f} MB -> "
+                  f"{record['compressed_size'] / 1e6:.1f} MB in {record['duration']:.1f} s ({record['file']})")
+        else:
+            print(f"{record['database']}: backup failed: {record['error']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+from datetime import datetime, timedelta
+import charts
 import database
+import utils
 
 def format_currency(value):
     """Format a value as currency"""
@@ -19,8 +21,14 @@ def show_balance_sheet():
         max_value=datetime.now().date()
     )
     
-    # Get balance sheet data
-    balance_data = database.get_balance_sheet_data(as_of_date.strftime("%Y-%m-%d"))
+    # Get balance sheet data (optionally from the reporting snapshot or in the background)
+    with utils.report_source_selector("balance_sheet_snapshot"):
+        balance_data = utils.run_report("balance_sheet", {
+            "as_of_date": as_of_date.strftime("%Y-%m-%d")
+        }, key="balance_sheet_background")
+    
+    if balance_data is None:
+        return
     
     # Display balance sheet
     st.subheader(f"Balance Sheet as of {as_of_date}")
@@ -80,6 +88,12 @@ def show_balance_sheet():
     st.markdown("#### Total Liabilities and Equity")
     st.metric("", format_currency(balance_data["total_liabilities"] + balance_data["equity"]))
     
+    # Receivables aging
+    show_receivables_aging(as_of_date)
+    
+    # Month by month (or other period) totals leading up to the date
+    show_balance_sheet_trends(as_of_date)
+    
     # Visualization
     st.subheader("Asset Distribution")
     
@@ -123,3 +137,127 @@ def show_balance_sheet():
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("No liabilities or equity to display in chart")
+
+def show_receivables_aging(as_of_date):
+    """Display receivables per party split into aging buckets"""
+    st.subheader("Receivables Aging")
+    
+    with utils.report_source_selector("aging_snapshot"):
+        aging = utils.run_report("receivables_aging", {
+            "as_of_date": as_of_date.strftime("%Y-%m-%d")
+        }, key="aging_background")
+    
+    if aging is None:
+        return
+    
+    if aging.empty:
+        st.info("No outstanding receivables")
+        return
+    
+    bucket_labels = [label for label, _, _ in database.AGING_BUCKETS]
+    
+    # Bucket totals
+    columns = st.columns(len(bucket_labels))
+    for column, label in zip(columns, bucket_labels):
+        with column:
+            st.metric(label, format_currency(aging[label].sum()))
+    
+    # Bucket totals chart
+    bucket_totals = pd.DataFrame({
+        "Bucket": bucket_labels,
+        "Amount": [aging[label].sum() for label in bucket_labels]
+    })
+    fig = px.bar(
+        bucket_totals,
+        x="Bucket",
+        y="Amount",
+        title="Receivables by Age",
+        labels={"Amount": "Amount (Rs.)"},
+        color_discrete_sequence=['#1f77b4']
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Per-party aging table
+    aging_df = aging.copy()
+    aging_df.columns = ["Party"] + bucket_labels + ["Total Due"]
+    st.dataframe(
+        aging_df,
+        use_container_width=True,
+        height=400,
+        column_config={
+            label: st.column_config.NumberColumn(format="Rs. %.2f")
+            for label in bucket_labels + ["Total Due"]
+        }
+    )
+
+def show_balance_sheet_trends(as_of_date):
+    """Display balance sheet totals over time as trend charts"""
+    st.subheader("Balance Sheet Trends")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        frequency = st.selectbox(
+            "Period",
+            list(database.TREND_FREQUENCIES),
+            index=1,
+            key="balance_trend_frequency"
+        )
+    with col2:
+        start_date = st.date_input(
+            "From",
+            value=as_of_date - timedelta(days=365),
+            max_value=as_of_date,
+            key="balance_trend_start"
+        )
+    
+    with utils.report_source_selector("balance_trend_snapshot"):
+        series = utils.run_report("balance_sheet_series", {
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": as_of_date.strftime("%Y-%m-%d"),
+            "freq": database.TREND_FREQUENCIES[frequency]
+        }, key="balance_trend_background")
+    
+    if series is None:
+        return
+    
+    if series.empty:
+        st.info("No periods to display")
+        return
+    
+    # Long ranges of short periods are binned to period-end values so the charts stay light
+    series = charts.limit_points(series, "period_end", how="last")
+    
+    # Assets and liabilities by period
+    components = series.melt(
+        id_vars="period_end",
+        value_vars=["inventory_total", "receivables_total", "payables_total"],
+        var_name="Component",
+        value_name="Amount"
+    )
+    components["Component"] = components["Component"].map({
+        "inventory_total": "Inventory",
+        "receivables_total": "Receivables",
+        "payables_total": "Payables"
+    })
+    fig = px.line(
+        components,
+        x="period_end",
+        y="Amount",
+        color="Component",
+        markers=True,
+        title="Assets and Liabilities",
+        labels={"period_end": "Period End", "Amount": "Amount (Rs.)"}
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Equity by period
+    fig = px.line(
+        series,
+        x="period_end",
+        y="equity",
+        markers=True,
+        title="Owner's Equity",
+        labels={"period_end": "Period End", "equity": "Equity (Rs.)"},
+        color_discrete_sequence=['#2ca02c']
+    )
+    st.plotly_chart(fig, use_container_width=True)
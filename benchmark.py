@@ -0,0 +1,186 @@
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+import columnar_store
+import database
+import storage
+import tenants
+
+def generate_database(path, parties=500, items=200, transactions=200000, days=730, seed=42):
+    """Create a database filled with random parties, items and transactions"""
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    database.initialize_database(conn)
+
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+
+    cursor.executemany(
+        "INSERT INTO parties (name, contact_person, phone) VALUES (?, ?, ?)",
+        [(f"Party {i:05d}", f"Contact {i}", f"0300-{i:07d}") for i in range(1, parties + 1)]
+    )
+    cursor.executemany(
+        "INSERT INTO items (name, description, unit) VALUES (?, ?, ?)",
+        [(f"Item {i:05d}", f"Description {i}", rng.choice(["kg", "pcs", "bag", "ltr"]))
+         for i in range(1, items + 1)]
+    )
+    cursor.execute("INSERT INTO inventory (item_id, quantity) SELECT id, 0 FROM items")
+
+    # Transactions arrive in date order, as they would from the gatebook
+    fmt = storage.get_storage_format(conn)
+    start = date.today() - timedelta(days=days)
+    rows = []
+    for n in range(transactions):
+        transaction_date = start + timedelta(days=n * days // transactions)
+        quantity = round(rng.uniform(1, 100), 2)
+        rate = round(rng.uniform(10, 500), 2)
+        row = fmt.transaction_row(transaction_date.isoformat(), quantity, rate, quantity * rate)
+        row.update(
+            party_id=rng.randint(1, parties),
+            item_id=rng.randint(1, items),
+            description=None,
+            transaction_type="incoming" if rng.random() < 0.55 else "outgoing"
+        )
+        rows.append(row)
+    columns = list(rows[0]) if rows else []
+    cursor.executemany(
+        f"INSERT INTO transactions ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})",
+        rows
+    )
+
+    # Stored stock matches what the transactions imply
+    cursor.execute(f"""
+    UPDATE inventory SET quantity = COALESCE((
+        SELECT {fmt.quantity("SUM(CASE WHEN transaction_type = 'incoming' THEN quantity ELSE -quantity END)")}
+        FROM transactions WHERE transactions.item_id = inventory.item_id
+    ), 0)
+    """)
+
+    conn.commit()
+    conn.close()
+
+def timed(func, repeat=5):
+    """Return the best wall time in milliseconds over several runs"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_columnar(path):
+    """Compare the SQL aggregation paths with the columnar store"""
+    tenants.DEFAULT_DATABASE = path
+    as_of_date = date.today().isoformat()
+
+    def sql_dashboard():
+        conn = database.get_connection()
+        database.get_sql_transaction_aggregates(conn)
+        conn.close()
+
+    def store_dashboard():
+        conn = database.get_connection()
+        database.get_store_transaction_aggregates(conn)
+        conn.close()
+
+    def sql_balances():
+        conn = database.get_connection()
+        database.get_sql_party_balances(conn, as_of_date)
+        conn.close()
+
+    def store_balances():
+        conn = database.get_connection()
+        database.get_store_party_balances(conn, as_of_date)
+        conn.close()
+
+    # Cold load of the store from an empty cache
+    columnar_store.reset_store(tenants.company_path())
+    load_ms = timed(lambda: store_dashboard(), repeat=1)
+
+    results = [
+        ("store initial load + dashboard", load_ms),
+        ("dashboard aggregates (SQL)", timed(sql_dashboard)),
+        ("dashboard aggregates (store)", timed(store_dashboard)),
+        ("balance sheet parties (SQL)", timed(sql_balances)),
+        ("balance sheet parties (store)", timed(store_balances)),
+    ]
+
+    # Incremental tail after a single new gatebook entry
+    database.add_transaction(as_of_date, 1, 1, 1.0, 1.0, None, "incoming")
+    results.append(("store tail 1 new row + dashboard", timed(store_dashboard, repeat=1)))
+
+    for label, elapsed in results:
+        print(f"{label:<36} {elapsed:10.1f} ms")
+
+def bench_compact(path):
+    """Compare database size and aggregation speed of the standard and compact formats"""
+    compact_path = path + ".compact"
+    shutil.copyfile(path, compact_path)
+    conn = sqlite3.connect(compact_path, isolation_level=None)
+    started = time.perf_counter()
+    storage.migrate_to_compact(conn)
+    conn.close()
+    print(f"migration took {time.perf_counter() - started:.1f} s")
+
+    # Compact the original as well so the sizes compare like for like
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("VACUUM")
+    conn.close()
+    print(f"{'database size (standard)':<36} {os.path.getsize(path) / 1e6:10.1f} MB")
+    print(f"{'database size (compact)':<36} {os.path.getsize(compact_path) / 1e6:10.1f} MB")
+
+    as_of_date = date.today().isoformat()
+    for label, database_path in [("standard", path), ("compact", compact_path)]:
+        tenants.DEFAULT_DATABASE = database_path
+
+        def dashboard():
+            conn = database.get_connection()
+            database.get_sql_transaction_aggregates(conn)
+            conn.close()
+
+        def balances():
+            conn = database.get_connection()
+            database.get_sql_party_balances(conn, as_of_date)
+            conn.close()
+
+        for name, func in [
+            ("dashboard aggregates", dashboard),
+            ("balance sheet parties", balances),
+            ("receivables aging", lambda: database.get_receivables_aging(as_of_date)),
+        ]:
+            print(f"{name + ' (' + label + ')':<36} {timed(func):10.1f} ms")
+
+BENCHMARKS = {
+    "columnar": bench_columnar,
+    "compact": bench_compact,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data access paths on a generated database")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--transactions", type=int, default=200000)
+    parser.add_argument("--parties", type=int, default=500)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--database", help="Existing database to use instead of generating one")
+    args = parser.parse_args()
+
+    path = args.database
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+        started = time.perf_counter()
+        generate_database(path, args.parties, args.items, args.transactions)
+        print(f"generated {args.transactions} transactions in {time.perf_counter() - started:.1f} s")
+
+    BENCHMARKS[args.benchmark](path)
+
+if __name__ == "__main__":
+    main()
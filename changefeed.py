@@ -0,0 +1,150 @@
+import pandas as pd
+
+# Tables whose inserts, updates and deletes are recorded in the change log
+TRACKED_TABLES = ("transactions", "parties", "items", "inventory")
+
+OPERATIONS = ("insert", "update", "delete")
+
+BATCH_SIZE = 1000
+
+CHANGE_LOG_TABLE = '''
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, -- never reused, so it only increases
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL, -- 0 for a bulk delete of many rows
+    operation TEXT NOT NULL, -- 'insert', 'update' or 'delete'
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+CURSORS_TABLE = '''
+CREATE TABLE IF NOT EXISTS change_cursors (
+    subscriber TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL, -- last change the subscriber has processed
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+# Changes are only logged while a subscriber exists; new subscribers start at the end of the log
+TRIGGER = '''
+CREATE TRIGGER IF NOT EXISTS change_log_{table}_{operation}
+AFTER {operation} ON {table}
+WHEN EXISTS (SELECT 1 FROM change_cursors)
+BEGIN
+    INSERT INTO change_log (table_name, row_id, operation) VALUES ('{table}', {row}.id, '{operation}');
+END
+'''
+
+def create_change_log(conn):
+    """Create the change log, subscriber cursors and the triggers that feed the log"""
+    conn.execute(CHANGE_LOG_TABLE)
+    conn.execute(CURSORS_TABLE)
+    for table in TRACKED_TABLES:
+        create_triggers(conn, table)
+
+def create_triggers(conn, table):
+    """Create the change log triggers of one table (needed again if the table is rebuilt)"""
+    for operation in OPERATIONS:
+        conn.execute(TRIGGER.format(
+            table=table,
+            operation=operation,
+            row="OLD" if operation == "delete" else "NEW"
+        ))
+
+def drop_triggers(conn, table):
+    """Drop the change log triggers of one table"""
+    for operation in OPERATIONS:
+        conn.execute(f"DROP TRIGGER IF EXISTS change_log_{table}_{operation}")
+
+def bulk_delete(conn, table, condition, params=()):
+    """Delete many rows of a table inside the caller's transaction, logging one change instead of one per row"""
+    # DDL is transactional in SQLite, so other connections never see the table without its trigger
+    name = table.split(".")[-1]
+    tracked = name in TRACKED_TABLES
+    if tracked:
+        conn.execute(f"DROP TRIGGER IF EXISTS change_log_{name}_delete")
+    removed = conn.execute(f"DELETE FROM {table} WHERE {condition}", params).rowcount
+    if tracked:
+        create_triggers(conn, name)
+        if removed:
+            conn.execute(
+                """INSERT INTO change_log (table_name, row_id, operation)
+                SELECT ?, 0, 'delete' WHERE EXISTS (SELECT 1 FROM change_cursors)""",
+                (name,)
+            )
+    return removed
+
+def latest_seq(conn):
+    """Sequence number of the most recent change, or 0 if there are none"""
+    # Read from the AUTOINCREMENT counter, which trimming the log does not reset
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+def get_cursor(conn, subscriber):
+    """Last change a subscriber has processed, or None if it has not subscribed"""
+    row = conn.execute("SELECT seq FROM change_cursors WHERE subscriber = ?", (subscriber,)).fetchone()
+    return row[0] if row else None
+
+def set_cursor(conn, subscriber, seq):
+    """Record that a subscriber has processed every change up to seq, trimming what all of them have"""
+    conn.execute(
+        """INSERT INTO change_cursors (subscriber, seq) VALUES (?, ?)
+        ON CONFLICT (subscriber) DO UPDATE SET seq = excluded.seq, updated_at = CURRENT_TIMESTAMP""",
+        (subscriber, seq)
+    )
+    trim_change_log(conn)
+
+def subscribe(conn, subscriber):
+    """Start a subscriber at the current end of the log, returning its cursor"""
+    # Subscribe before building the initial state from the tables, so changes
+    # made meanwhile are delivered again rather than lost
+    seq = get_cursor(conn, subscriber)
+    if seq is None:
+        seq = latest_seq(conn)
+        set_cursor(conn, subscriber, seq)
+    return seq
+
+def unsubscribe(conn, subscriber):
+    """Forget a subscriber so it no longer holds back trimming"""
+    conn.execute("DELETE FROM change_cursors WHERE subscriber = ?", (subscriber,))
+    trim_change_log(conn)
+
+def read_changes(conn, after_seq, limit=BATCH_SIZE, tables=None):
+    """Changes with a sequence number greater than after_seq, oldest first"""
+    query = "SELECT seq, table_name, row_id, operation, changed_at FROM change_log WHERE seq > ?"
+    params = [after_seq]
+    if tables:
+        query += f" AND table_name IN ({', '.join('?' for _ in tables)})"
+        params.extend(tables)
+    query += " ORDER BY seq LIMIT ?"
+    params.append(limit)
+    return pd.read_sql_query(query, conn, params=params)
+
+def iter_changes(conn, subscriber, batch_size=BATCH_SIZE, tables=None):
+    """Yield batches of a subscriber's unprocessed changes, advancing its cursor after each one"""
+    # The cursor moves only when the consumer asks for the next batch, so a
+    # batch interrupted by an error is delivered again on the next run
+    seq = subscribe(conn, subscriber)
+    while True:
+        batch = read_changes(conn, seq, batch_size, tables)
+        if batch.empty:
+            return
+        yield batch
+        seq = int(batch["seq"].iloc[-1])
+        set_cursor(conn, subscriber, seq)
+
+def changed_ids(batch, table):
+    """Ids of the rows of one table touched by a batch"""
+    return set(batch.loc[batch["table_name"] == table, "row_id"].tolist())
+
+def trim_change_log(conn):
+    """Delete changes every subscriber has processed, returning how many were removed"""
+    # New subscribers start at the end of the log, so without any subscriber nothing is needed;
+    # sequence numbers keep increasing after the log is emptied
+    oldest = conn.execute("SELECT MIN(seq) FROM change_cursors").fetchone()[0]
+    if oldest is None:
+        removed = conn.execute("DELETE FROM change_log").rowcount
+    else:
+        removed = conn.execute("DELETE FROM change_log WHERE seq <= ?", (oldest,)).rowcount
+    conn.commit()
+    return removed
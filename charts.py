@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Bars or slices shown per categorical chart; the rest are summed into one "Other" entry
+CHART_TOP_N = int(os.environ.get("CHART_TOP_N", "20"))
+
+# Points per time series trace; longer series are binned down to this many
+CHART_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "500"))
+
+# Upper bound on the JSON size of a chart's data, in bytes
+CHART_MAX_BYTES = int(os.environ.get("CHART_MAX_BYTES", "200000"))
+
+OTHER_LABEL = "Other"
+
+def payload_size(frame):
+    """Approximate size in bytes of a chart's data once serialized for the browser"""
+    return len(frame.to_json(orient="split", date_format="iso"))
+
+def top_n(frame, label_column, value_column, limit=CHART_TOP_N, sum_columns=None, other_label=OTHER_LABEL):
+    """Largest rows by a value, with the remaining rows summed into one labelled row"""
+    if len(frame) <= limit:
+        return frame
+
+    ranked = frame.sort_values(value_column, ascending=False, kind="stable")
+    top, rest = ranked.iloc[:limit - 1], ranked.iloc[limit - 1:]
+
+    # Only additive columns make sense for the combined row
+    columns = [value_column] + [column for column in sum_columns or [] if column != value_column]
+    other = {column: rest[column].sum() for column in columns}
+    other[label_column] = f"{other_label} ({len(rest):,})"
+    return pd.concat([top, pd.DataFrame([other])], ignore_index=True)
+
+def downsample(frame, x_column, limit=CHART_MAX_POINTS, how="last"):
+    """Bin consecutive rows of an x-ordered series down to at most limit rows"""
+    if len(frame) <= limit:
+        return frame
+
+    # Equal-sized runs of rows; each bin is labelled by its last x value, so
+    # "last" keeps period-end levels and "sum" keeps flow totals
+    bins = np.arange(len(frame)) * limit // len(frame)
+    values = frame.drop(columns=x_column).groupby(bins).agg(how)
+    values.insert(0, x_column, frame[x_column].groupby(bins).last().to_numpy())
+    return values.reset_index(drop=True)
+
+def limit_categories(frame, label_column, value_column, limit=CHART_TOP_N, sum_columns=None, max_bytes=CHART_MAX_BYTES):
+    """Top entries plus an "Other" row, with fewer entries if the data would exceed the payload cap"""
+    reduced = top_n(frame, label_column, value_column, limit, sum_columns)
+    while limit > 2 and payload_size(reduced) > max_bytes:
+        limit //= 2
+        reduced = top_n(frame, label_column, value_column, limit, sum_columns)
+    return reduced
+
+def limit_points(frame, x_column, limit=CHART_MAX_POINTS, how="last", max_bytes=CHART_MAX_BYTES):
+    """Time series binned to at most limit points, with fewer if the data would exceed the payload cap"""
+    reduced = downsample(frame, x_column, limit, how)
+    while limit > 2 and payload_size(reduced) > max_bytes:
+        limit //= 2
+        reduced = downsample(frame, x_column, limit, how)
+    return reduced
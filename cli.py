@@ -0,0 +1,172 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+import database
+import tenants
+
+# Output formats by file extension; anything else (or "-") is written as CSV
+FORMATS = (".csv", ".json", ".html")
+
+def write_frame(frame, output):
+    """Write a report to a file, choosing the format from its extension (stdout as CSV for "-")"""
+    if output in (None, "-"):
+        frame.to_csv(sys.stdout, index=False)
+        return
+
+    extension = os.path.splitext(output)[1].lower()
+    if extension == ".json":
+        frame.to_json(output, orient="records", date_format="iso", indent=2)
+    elif extension == ".html":
+        frame.to_html(output, index=False)
+    else:
+        frame.to_csv(output, index=False)
+
+def write_chunks(chunks, output):
+    """Write ledger chunks to a CSV file (or stdout) one at a time, so memory stays flat"""
+    target = sys.stdout if output in (None, "-") else open(output, "w", newline="")
+    rows = 0
+    try:
+        for chunk in chunks:
+            chunk.to_csv(target, index=False, header=rows == 0)
+            rows += len(chunk)
+    finally:
+        if target is not sys.stdout:
+            target.close()
+    return rows
+
+def resolve(rows, value, kind):
+    """Id of a party or item given its id or exact name"""
+    if value.isdigit() and int(value) in rows.index:
+        return int(value)
+    matches = rows.index[rows["name"] == value]
+    if len(matches) == 0:
+        raise SystemExit(f"error: no {kind} named or numbered {value!r}")
+    return int(matches[0])
+
+def balance_sheet_frame(data):
+    """Balance sheet sections as one table of (section, name, quantity, rate, amount) rows"""
+    inventory = pd.DataFrame({
+        "section": "Inventory",
+        "name": data["inventory"]["item_name"],
+        "quantity": data["inventory"]["quantity"],
+        "rate": data["inventory"]["rate"],
+        "amount": data["inventory"]["value"]
+    })
+    receivables = pd.DataFrame({
+        "section": "Receivables",
+        "name": data["receivables"]["party_name"],
+        "amount": data["receivables"]["balance"]
+    })
+    payables = pd.DataFrame({
+        "section": "Payables",
+        "name": data["payables"]["party_name"],
+        "amount": data["payables"]["balance"]
+    })
+    totals = pd.DataFrame({
+        "section": "Total",
+        "name": ["Inventory", "Receivables", "Total Assets", "Total Liabilities", "Owner's Equity"],
+        "amount": [data["inventory_total"], data["receivables_total"], data["total_assets"],
+                   data["total_liabilities"], data["equity"]]
+    })
+    frames = [frame for frame in (inventory, receivables, payables, totals) if not frame.empty]
+    return pd.concat(frames, ignore_index=True)[["section", "name", "quantity", "rate", "amount"]]
+
+def party_ledger(args):
+    """Write a party's ledger"""
+    party_id = resolve(database.get_all_parties(), args.party, "party")
+    if os.path.splitext(args.output or "")[1].lower() in (".json", ".html"):
+        ledger = database.get_party_ledger(party_id, args.start_date, args.end_date)
+        write_frame(ledger, args.output)
+        return len(ledger)
+    return write_chunks(database.iter_party_ledger(party_id, args.start_date, args.end_date), args.output)
+
+def item_ledger(args):
+    """Write an item's ledger"""
+    item_id = resolve(database.get_all_items(), args.item, "item")
+    if os.path.splitext(args.output or "")[1].lower() in (".json", ".html"):
+        ledger = database.get_item_ledger(item_id, args.start_date, args.end_date)
+        write_frame(ledger, args.output)
+        return len(ledger)
+    return write_chunks(database.iter_item_ledger(item_id, args.start_date, args.end_date), args.output)
+
+def general_ledger(args):
+    """Write every transaction in a date range"""
+    transactions = database.get_transactions(args.start_date, args.end_date)
+    write_frame(transactions, args.output)
+    return len(transactions)
+
+def balance_sheet(args):
+    """Write the balance sheet as of a date"""
+    frame = balance_sheet_frame(database.get_balance_sheet_data(args.as_of))
+    write_frame(frame, args.output)
+    return len(frame)
+
+def receivables_aging(args):
+    """Write receivables per party by age"""
+    aging = database.get_receivables_aging(args.as_of)
+    write_frame(aging, args.output)
+    return len(aging)
+
+def inventory(args):
+    """Write current stock and value per item"""
+    status = database.get_inventory_status().drop(columns="row_version")
+    write_frame(status, args.output)
+    return len(status)
+
+def build_parser():
+    """Command line options of every report"""
+    parser = argparse.ArgumentParser(description="Generate business reports without the web app")
+    parser.add_argument("--company", help="company database file (default: the default database)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, func, help_text):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("-o", "--output", help=f"output file ({', '.join(FORMATS)}); default: CSV on stdout")
+        command.set_defaults(func=func)
+        return command
+
+    def add_date_range(command):
+        command.add_argument("--from", dest="start_date", help="first date (YYYY-MM-DD)")
+        command.add_argument("--to", dest="end_date", help="last date (YYYY-MM-DD)")
+
+    command = add_command("party-ledger", party_ledger, "ledger of one party")
+    command.add_argument("party", help="party id or name")
+    add_date_range(command)
+
+    command = add_command("item-ledger", item_ledger, "ledger of one item")
+    command.add_argument("item", help="item id or name")
+    add_date_range(command)
+
+    add_date_range(add_command("general-ledger", general_ledger, "all transactions"))
+
+    for name, func, help_text in (
+        ("balance-sheet", balance_sheet, "assets, liabilities and equity"),
+        ("aging", receivables_aging, "receivables by age")
+    ):
+        add_command(name, func, help_text).add_argument(
+            "--as-of", default=datetime.now().strftime("%Y-%m-%d"), help="report date (YYYY-MM-DD, default today)"
+        )
+
+    add_command("inventory", inventory, "stock levels and value")
+    return parser
+
+def main(argv=None):
+    """Run one report and write it to a file or stdout"""
+    args = build_parser().parse_args(argv)
+    tenants.set_current_company(args.company)
+
+    if args.company and not os.path.exists(tenants.company_path(args.company)):
+        print(f"error: company database {args.company} does not exist", file=sys.stderr)
+        return 1
+
+    rows = args.func(args)
+    if args.output not in (None, "-"):
+        print(f"wrote {rows} rows to {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import functools
+import threading
+import numpy as np
+import pandas as pd
+import storage
+
+# Transaction types are stored as small integer codes
+TRANSACTION_TYPES = ["incoming", "outgoing"]
+INCOMING = 0
+OUTGOING = 1
+
+# Columns tailed from the transactions table, with their array dtypes
+COLUMNS = {
+    "id": np.int64,
+    "day": np.int32,
+    "party_id": np.int32,
+    "item_id": np.int32,
+    "type_code": np.uint8,
+    "quantity": np.float64,
+    "rate": np.float64,
+    "amount": np.float64,
+}
+
+TAIL_QUERY = """
+SELECT id, {day} as day, party_id, item_id,
+       CASE WHEN transaction_type = 'incoming' THEN 0 ELSE 1 END as type_code,
+       {quantity} as quantity, {rate} as rate, {amount} as amount
+FROM transactions
+WHERE id > ?
+ORDER BY id
+"""
+
+def day_to_month(days):
+    """Convert day numbers to month numbers since 1970-01"""
+    return np.asarray(days, dtype="datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+def month_label(months):
+    """Format month numbers as 'YYYY-MM' strings"""
+    return np.asarray(months, dtype="datetime64[M]").astype(str)
+
+def locked(method):
+    """Run a store method under the store's lock, so every column it reads has the same length"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class TransactionStore:
+    """Typed NumPy columns of the transactions table, appended by tailing new ids"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.last_id = 0
+        self.size = 0
+        self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._date_order = None
+        self.closed_through = None  # year-end close the rows were loaded after
+
+    def __len__(self):
+        return self.size
+
+    def column(self, name):
+        """Return a read-only view of a loaded column (hold the lock while combining columns)"""
+        view = self._columns[name][:self.size]
+        view.flags.writeable = False
+        return view
+
+    def refresh(self, conn):
+        """Append transactions with id greater than the last one seen"""
+        fmt = storage.get_storage_format(conn)
+        query = TAIL_QUERY.format(
+            day=fmt.day("transaction_date"),
+            quantity=fmt.quantity("quantity"),
+            rate=fmt.money("rate"),
+            amount=fmt.money("amount")
+        )
+        with self.lock:
+            rows = conn.execute(query, (self.last_id,)).fetchall()
+            if not rows:
+                return 0
+
+            # Each column is converted straight to its own dtype, so ids never pass through floats
+            count = len(rows)
+            self._reserve(self.size + count)
+            for (name, dtype), values in zip(COLUMNS.items(), zip(*rows)):
+                self._columns[name][self.size:self.size + count] = np.array(values, dtype=dtype)
+
+            self.size += count
+            self.last_id = int(rows[-1][0])
+            self._date_order = None
+            return count
+
+    def _reserve(self, capacity):
+        """Grow the column buffers geometrically so appends stay amortized O(1)"""
+        current = len(self._columns["id"])
+        if capacity <= current:
+            return
+
+        new_capacity = max(capacity, current * 2, 1024)
+        for name, dtype in COLUMNS.items():
+            grown = np.empty(new_capacity, dtype=dtype)
+            grown[:self.size] = self._columns[name][:self.size]
+            self._columns[name] = grown
+
+    @locked
+    def date_order(self):
+        """Row positions sorted by (day, id), cached until the next append"""
+        if self._date_order is None:
+            self._date_order = np.argsort(self.column("day"), kind="stable")
+        return self._date_order
+
+    @locked
+    def rows_through(self, day):
+        """Row positions of transactions dated on or before the given day number"""
+        order = self.date_order()
+        end = np.searchsorted(self.column("day")[order], day, side="right")
+        return order[:end]
+
+    @locked
+    def rows_from(self, day):
+        """Row positions of transactions dated on or after the given day number"""
+        order = self.date_order()
+        start = np.searchsorted(self.column("day")[order], day, side="left")
+        return order[start:]
+
+    @locked
+    def signed_amount(self, positive_type):
+        """Amounts signed positive for one transaction type and negative for the other"""
+        amount = self.column("amount")
+        return np.where(self.column("type_code") == positive_type, amount, -amount)
+
+    @locked
+    def type_counts(self):
+        """Number of transactions per type, for types that occur"""
+        counts = np.bincount(self.column("type_code"), minlength=len(TRANSACTION_TYPES))
+        present = np.flatnonzero(counts)
+        return pd.DataFrame({
+            "transaction_type": [TRANSACTION_TYPES[code] for code in present],
+            "count": counts[present]
+        })
+
+    @locked
+    def monthly_totals(self, since_day):
+        """Incoming and outgoing amounts per month from the given day onwards"""
+        rows = self.rows_from(since_day)
+        if len(rows) == 0:
+            return pd.DataFrame(columns=["month", "incoming", "outgoing"])
+
+        months = day_to_month(self.column("day")[rows])
+        first = months.min()
+        offsets = months - first
+        amount = self.column("amount")[rows]
+        outgoing = self.column("type_code")[rows] == OUTGOING
+
+        length = offsets.max() + 1
+        incoming_totals = np.bincount(offsets, weights=np.where(outgoing, 0.0, amount), minlength=length)
+        outgoing_totals = np.bincount(offsets, weights=np.where(outgoing, amount, 0.0), minlength=length)
+        present = np.flatnonzero(np.bincount(offsets, minlength=length))
+
+        return pd.DataFrame({
+            "month": month_label(present + first),
+            "incoming": incoming_totals[present],
+            "outgoing": outgoing_totals[present]
+        })
+
+    @locked
+    def totals_by(self, key, weights, rows=None):
+        """Sum weights grouped by an id column, returning (ids, totals) for ids that occur"""
+        keys = self.column(key)
+        if rows is not None:
+            keys = keys[rows]
+            weights = weights[rows]
+        if len(keys) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        totals = np.bincount(keys, weights=weights)
+        present = np.flatnonzero(np.bincount(keys))
+        return present, totals[present]
+
+    @locked
+    def top_totals(self, key, names, name_column, limit=5):
+        """Top ids by total transaction amount, labelled with their names"""
+        ids, totals = self.totals_by(key, self.column("amount"))
+        top = np.argsort(-totals, kind="stable")[:limit]
+        return pd.DataFrame({
+            name_column: [names.get(int(i)) for i in ids[top]],
+            "total_value": totals[top]
+        })
+
+    @locked
+    def party_balances(self, as_of_day, positive_type, names, opening=None):
+        """Positive per-party balances through a date, signed in favour of one type, plus opening balances"""
+        rows = self.rows_through(as_of_day)
+        ids, balances = self.totals_by("party_id", self.signed_amount(positive_type), rows)
+        if opening:
+            totals = pd.Series(balances, index=ids).add(pd.Series(opening, dtype=float), fill_value=0.0)
+            ids, balances = totals.index.to_numpy(), totals.to_numpy()
+        keep = balances > 0
+        return pd.DataFrame({
+            "party_name": [names.get(int(i)) for i in ids[keep]],
+            "balance": balances[keep]
+        })
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(key):
+    """Return the process-wide store for a database, creating it on first use"""
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = TransactionStore()
+        return _stores[key]
+
+def reset_store(key):
+    """Drop a database's store so it is reloaded from scratch on next use"""
+    with _stores_lock:
+        _stores.pop(key, None)
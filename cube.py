@@ -0,0 +1,165 @@
+import threading
+import pandas as pd
+
+import changefeed
+
+# Change log subscriber that keeps the cube cells current
+SUBSCRIBER = "cube"
+
+# Dimensions of a cell, and the measures summed over its transactions
+DIMENSIONS = ("party_id", "item_id", "month", "transaction_type")
+MEASURES = ("count", "quantity", "amount")
+
+CELLS_TABLE = '''
+CREATE TABLE IF NOT EXISTS cube_cells (
+    party_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    month TEXT NOT NULL, -- 'YYYY-MM'
+    transaction_type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    quantity REAL NOT NULL, -- units
+    amount REAL NOT NULL, -- Rs.
+    PRIMARY KEY (party_id, item_id, month, transaction_type)
+) WITHOUT ROWID
+'''
+
+def create_cube_table(conn):
+    """Create the table of cube cells (filled on first use)"""
+    conn.execute(CELLS_TABLE)
+
+def cells_query(fmt, condition):
+    """Transactions matching a condition aggregated to cube cells"""
+    return f"""
+    SELECT party_id, item_id, {fmt.month()} as month, transaction_type,
+           COUNT(*), {fmt.quantity("SUM(quantity)")}, {fmt.money("SUM(amount)")}
+    FROM transactions
+    WHERE {condition}
+    GROUP BY party_id, item_id, {fmt.month_group()}, transaction_type
+    """
+
+def pending_changes(conn):
+    """The cube's change log cursor and the latest change, or a None cursor if it was never built"""
+    return changefeed.get_cursor(conn, SUBSCRIBER), changefeed.latest_seq(conn)
+
+def update_cells(conn, fmt):
+    """Apply changes since the last refresh to the cells, inside the caller's write transaction
+
+    Returns the cursor before and after, and the cells added up from new rows
+    (None after a rebuild)."""
+    seq, latest = pending_changes(conn)
+    edited = seq is not None and conn.execute(
+        """SELECT 1 FROM change_log
+        WHERE seq > ? AND table_name = 'transactions' AND operation != 'insert' LIMIT 1""",
+        (seq,)
+    ).fetchone()
+
+    delta = None
+    if seq is None or edited:
+        # Cells keep no per-row detail, so edits and deletes (a year-end close) mean a rebuild
+        conn.execute("DELETE FROM cube_cells")
+        conn.execute(f"INSERT INTO cube_cells {cells_query(fmt, '1=1')}")
+    else:
+        # New rows only add to their cells
+        new_rows = "id IN (SELECT row_id FROM change_log WHERE seq > ? AND seq <= ? AND table_name = 'transactions')"
+        delta = pd.read_sql_query(cells_query(fmt, new_rows), conn, params=(seq, latest))
+        delta.columns = list(DIMENSIONS + MEASURES)
+        conn.executemany(
+            """INSERT INTO cube_cells VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (party_id, item_id, month, transaction_type) DO UPDATE SET
+                count = count + excluded.count,
+                quantity = quantity + excluded.quantity,
+                amount = amount + excluded.amount""",
+            delta.itertuples(index=False)
+        )
+
+    # Commits the cells and the cursor together
+    changefeed.set_cursor(conn, SUBSCRIBER, latest)
+    return seq, latest, delta
+
+class Cube:
+    """Cube cells of one database in memory, with coarser cuboids rolled up from them on demand"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seq = None
+        self.cells = None
+        self.cuboids = {}
+
+    def load(self, conn, seq):
+        """Reload the cells if the database's cube has been refreshed past the loaded ones"""
+        with self.lock:
+            if seq == self.seq and self.cells is not None:
+                return
+            cells = pd.read_sql_query("SELECT * FROM cube_cells", conn)
+            for column in ("month", "transaction_type"):
+                cells[column] = cells[column].astype("category")
+            self.cells = cells
+            self.cuboids = {DIMENSIONS: cells}
+            self.seq = seq
+
+    def apply(self, delta, seq):
+        """Add new rows' cells to the loaded cells and every cuboid rolled up so far"""
+        # Cells may then repeat a key; every read groups again, so the sums stay right
+        with self.lock:
+            for dims, cuboid in list(self.cuboids.items()):
+                if dims:
+                    rolled = delta.groupby(list(dims), sort=False)[list(MEASURES)].sum().reset_index()
+                else:
+                    rolled = delta[list(MEASURES)].sum().to_frame().T
+                combined = pd.concat([cuboid, rolled], ignore_index=True)
+                for column in ("month", "transaction_type"):
+                    if column in combined.columns:
+                        combined[column] = combined[column].astype("category")
+                self.cuboids[dims] = combined
+            self.cells = self.cuboids[DIMENSIONS]
+            self.seq = seq
+
+    def cuboid(self, dimensions):
+        """Cells summed over every dimension not listed, computed once per refresh"""
+        key = tuple(d for d in DIMENSIONS if d in dimensions)
+        with self.lock:
+            cuboid = self.cuboids.get(key)
+            if cuboid is None:
+                # Roll up from the smallest cuboid already built that has every needed dimension
+                source = min(
+                    (c for dims, c in self.cuboids.items() if set(key) <= set(dims)),
+                    key=len
+                )
+                if key:
+                    cuboid = source.groupby(list(key), observed=True, sort=False)[list(MEASURES)].sum().reset_index()
+                else:
+                    cuboid = source[list(MEASURES)].sum().to_frame().T
+                self.cuboids[key] = cuboid
+            return cuboid
+
+    def slice(self, dimensions, filters=None):
+        """Measures grouped by some dimensions, over the cells matching filters of {dimension: values}"""
+        filters = {d: values for d, values in (filters or {}).items() if values is not None}
+        cuboid = self.cuboid(set(dimensions) | set(filters))
+        if filters:
+            mask = pd.Series(True, index=cuboid.index)
+            for dimension, values in filters.items():
+                mask &= cuboid[dimension].isin(values)
+            cuboid = cuboid[mask]
+        if not dimensions:
+            return cuboid[list(MEASURES)].sum().to_frame().T
+        return cuboid.groupby(list(dimensions), observed=True)[list(MEASURES)].sum().reset_index()
+
+    def members(self, dimension):
+        """Distinct values of a dimension, in order"""
+        return sorted(self.cuboid({dimension})[dimension].drop_duplicates().tolist())
+
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+def get_cube(key):
+    """Return the process-wide cube of a database, creating it on first use"""
+    with _cubes_lock:
+        if key not in _cubes:
+            _cubes[key] = Cube()
+        return _cubes[key]
+
+def reset_cube(key):
+    """Drop a database's cube from memory"""
+    with _cubes_lock:
+        _cubes.pop(key, None)
@@ -1,20 +1,44 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import charts
 import database
+import forecast
 from datetime import datetime, timedelta
 
 def format_currency(value):
     """Format a value as currency"""
     return f"Rs. {value:,.2f}"
 
+# Seconds between change checks in live mode
+LIVE_INTERVAL = 5
+
+@st.fragment(run_every=LIVE_INTERVAL)
+def watch_for_changes(version):
+    """Rerun the dashboard only when the database has changed since it was drawn"""
+    current = database.get_data_version()
+    if current != version:
+        st.rerun()
+    st.caption(f"Live mode: checking for new data every {LIVE_INTERVAL} seconds "
+               f"(last checked {datetime.now().strftime('%H:%M:%S')})")
+
 def show_dashboard():
     """Display the dashboard with widgets and charts"""
     st.title("Business Dashboard")
     
+    # Live mode keeps a wall-mounted dashboard current without recomputing everything
+    live = st.toggle("Live mode", key="dashboard_live",
+                     help="Refresh automatically when new data is entered")
+    
     # Get dashboard data
-    dashboard_data = database.get_dashboard_data()
+    if live:
+        version = database.get_data_version()
+        dashboard_data = database.get_live_dashboard_data()
+        watch_for_changes(version)
+    else:
+        dashboard_data = database.get_dashboard_data()
     
     # Key metrics row
     col1, col2, col3, col4 = st.columns(4)
@@ -36,16 +60,17 @@ def show_dashboard():
     
     # Monthly transactions chart
     if not dashboard_data["monthly_transactions"].empty:
+        monthly = charts.limit_points(dashboard_data["monthly_transactions"], "month", how="sum")
         monthly_fig = go.Figure()
         monthly_fig.add_trace(go.Bar(
-            x=dashboard_data["monthly_transactions"]["month"],
-            y=dashboard_data["monthly_transactions"]["incoming"],
+            x=monthly["month"],
+            y=monthly["incoming"],
             name="Incoming",
             marker_color='green'
         ))
         monthly_fig.add_trace(go.Bar(
-            x=dashboard_data["monthly_transactions"]["month"],
-            y=dashboard_data["monthly_transactions"]["outgoing"],
+            x=monthly["month"],
+            y=monthly["outgoing"],
             name="Outgoing",
             marker_color='red'
         ))
@@ -102,7 +127,7 @@ def show_dashboard():
     with col1:
         if not dashboard_data["transaction_types"].empty:
             types_fig = px.pie(
-                dashboard_data["transaction_types"],
+                charts.limit_categories(dashboard_data["transaction_types"], "transaction_type", "count"),
                 values="count",
                 names="transaction_type",
                 title="Transaction Types Distribution",
@@ -113,21 +138,37 @@ def show_dashboard():
         else:
             st.info("No transaction type data available for chart")
     
-    # Low stock items chart
+    # Items that will run out soon at their recent rate of sale
     with col2:
-        if not dashboard_data["low_stock_items"].empty:
+        # Cached per database and data version, so live mode reruns do not recompute it
+        stock_forecast = forecast.get_cached_stock_forecast()
+        at_risk = forecast.at_risk_items(stock_forecast)
+        if not at_risk.empty:
             stock_fig = px.bar(
-                dashboard_data["low_stock_items"],
+                at_risk,
                 x="item_name",
-                y="quantity",
-                title="Items with Low Stock",
-                labels={"item_name": "Item", "quantity": "Quantity"},
-                color_discrete_sequence=['#d62728']
+                y="days_of_cover",
+                color="status",
+                title=f"At Risk: Stock-out Within {forecast.AT_RISK_DAYS} Days",
+                labels={"item_name": "Item", "days_of_cover": "Days of Cover", "status": "Status"},
+                hover_data={"quantity": ":,.2f", "daily_demand": ":,.2f", "stockout_date": "|%Y-%m-%d"},
+                color_discrete_map={forecast.OUT_OF_STOCK: '#d62728', forecast.AT_RISK: '#ff7f0e'}
             )
             stock_fig.update_layout(height=350)
             st.plotly_chart(stock_fig, use_container_width=True)
         else:
-            st.info("All items have sufficient stock")
+            st.info(f"No item is expected to run out within {forecast.AT_RISK_DAYS} days")
+        
+        with st.expander("Stock cover of all items"):
+            cover_df = stock_forecast[["item_name", "quantity", "velocity_7d", "velocity_30d", "velocity_90d",
+                                       "days_of_cover", "stockout_date", "status"]].copy()
+            cover_df["days_of_cover"] = cover_df["days_of_cover"].replace(np.inf, np.nan)
+            cover_df.columns = ["Item", "Stock", "Per Day (7d)", "Per Day (30d)", "Per Day (90d)",
+                                "Days of Cover", "Stock-out Date", "Status"]
+            st.dataframe(cover_df, use_container_width=True, hide_index=True,
+                         column_config={"Stock-out Date": st.column_config.DateColumn(format="YYYY-MM-DD")})
+            st.caption("Daily demand weighs the last 7, 30 and 90 days of outgoing quantities "
+                       f"{' / '.join(f'{w:.0%}' for w in forecast.FORECAST_WEIGHTS)}")
     
     # Recent transactions
     st.subheader("Recent Transactions")
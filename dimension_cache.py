@@ -0,0 +1,56 @@
+import threading
+import pandas as pd
+
+class DimensionCache:
+    """Id-keyed rows of the parties and items tables, reloaded only when they may have changed"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.tables = {}
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, conn, table, version):
+        """Return a table's rows indexed by id, reloading it if the database changed"""
+        with self.lock:
+            # Another connection committed since the tables were loaded
+            if version != self.version:
+                self.tables.clear()
+                self.version = version
+
+            rows = self.tables.get(table)
+            if rows is None:
+                rows = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+                rows = rows.set_index("id", drop=False).rename_axis(None)
+                self.tables[table] = rows
+                self.loads += 1
+            else:
+                self.hits += 1
+            return rows
+
+    def invalidate(self, table):
+        """Drop one table so the next read reloads it"""
+        with self.lock:
+            self.tables.pop(table, None)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(key):
+    """Return the process-wide dimension cache for a database, creating it on first use"""
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = DimensionCache()
+        return _caches[key]
+
+def cache_stats():
+    """Total hits and loads over the caches of every database"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return sum(cache.hits for cache in caches), sum(cache.loads for cache in caches)
+
+def reset_cache(key):
+    """Drop a database's dimension cache"""
+    with _caches_lock:
+        _caches.pop(key, None)
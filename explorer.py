@@ -0,0 +1,182 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import time
+import charts
+import database
+
+# Dimensions of the cube with their display names
+DIMENSION_LABELS = {
+    "party_id": "Party",
+    "item_id": "Item",
+    "month": "Month",
+    "transaction_type": "Type"
+}
+
+MEASURE_LABELS = {
+    "amount": "Amount (Rs.)",
+    "quantity": "Quantity",
+    "count": "Transactions"
+}
+
+def member_label(dimension, value, names):
+    """Display name of a dimension value"""
+    if dimension in names:
+        return names[dimension].get(value, f"#{value}")
+    if dimension == "transaction_type":
+        return str(value).capitalize()
+    return str(value)
+
+def label_members(frame, names):
+    """Replace party and item ids in a cube slice with their names"""
+    frame = frame.copy()
+    for dimension in ("party_id", "item_id", "transaction_type"):
+        if dimension in frame.columns:
+            frame[dimension] = [member_label(dimension, value, names) for value in frame[dimension]]
+    return frame
+
+def drill_down(dimension):
+    """Filter on the chosen member and pivot its rows by the next dimension"""
+    # Runs before the next script run, so the rows selector can still be changed
+    st.session_state.cube_drill = st.session_state.cube_drill + [(dimension, st.session_state.cube_member)]
+    st.session_state.cube_rows = st.session_state.cube_next
+    st.session_state.pop("cube_columns", None)
+
+def drill_up():
+    """Remove the last drill-down filter"""
+    st.session_state.cube_drill = st.session_state.cube_drill[:-1]
+
+def show_cube_explorer():
+    """Display the cube explorer: pivot, filter and drill into party x item x month totals"""
+    st.title("Cube Explorer")
+    
+    started = time.perf_counter()
+    transaction_cube = database.get_cube()
+    names = {
+        "party_id": dict(database.get_all_parties()[["id", "name"]].itertuples(index=False)),
+        "item_id": dict(database.get_all_items()[["id", "name"]].itertuples(index=False))
+    }
+    
+    if transaction_cube.cells.empty:
+        st.info("No transactions to explore yet.")
+        return
+    
+    # Drill-down path: (dimension, value) pairs chosen so far
+    if "cube_drill" not in st.session_state:
+        st.session_state.cube_drill = []
+    drill = st.session_state.cube_drill
+    
+    # Layout of the pivot
+    col1, col2, col3 = st.columns(3)
+    dimensions = list(DIMENSION_LABELS)
+    drilled = [dimension for dimension, _ in drill]
+    
+    with col1:
+        rows_dimension = st.selectbox("Rows", dimensions, format_func=DIMENSION_LABELS.get, key="cube_rows")
+    
+    with col2:
+        column_options = [None] + [d for d in dimensions if d != rows_dimension]
+        columns_dimension = st.selectbox(
+            "Columns", column_options, format_func=lambda d: DIMENSION_LABELS.get(d, "(none)"), key="cube_columns"
+        )
+    
+    with col3:
+        measure = st.selectbox("Measure", list(MEASURE_LABELS), format_func=MEASURE_LABELS.get, key="cube_measure")
+    
+    # Filters on any dimension
+    filters = {dimension: [value] for dimension, value in drill}
+    with st.expander("Filters"):
+        months = transaction_cube.members("month")
+        if len(months) > 1:
+            first_month, last_month = st.select_slider(
+                "Months", options=months, value=(months[0], months[-1]), key="cube_months"
+            )
+            if (first_month, last_month) != (months[0], months[-1]):
+                filters.setdefault("month", [m for m in months if first_month <= m <= last_month])
+    
+        for dimension in ("party_id", "item_id", "transaction_type"):
+            members = transaction_cube.members(dimension)
+            selected = st.multiselect(
+                DIMENSION_LABELS[dimension], members,
+                format_func=lambda value, d=dimension: member_label(d, value, names),
+                key=f"cube_filter_{dimension}"
+            )
+            if selected:
+                filters[dimension] = [v for v in selected if v in filters.get(dimension, selected)]
+    
+    # Breadcrumb of the drill-down, with a way back up
+    if drill:
+        path = " › ".join(f"{DIMENSION_LABELS[d]}: {member_label(d, v, names)}" for d, v in drill)
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(f"**Drilled into** {path}")
+        with col2:
+            st.button("Up one level", key="cube_up", on_click=drill_up)
+    
+    result = transaction_cube.slice([rows_dimension] + ([columns_dimension] if columns_dimension else []), filters)
+    elapsed = time.perf_counter() - started
+    
+    if result.empty:
+        st.info("No transactions match the selected filters.")
+        return
+    
+    # Totals and the pivot table
+    totals = result[list(MEASURE_LABELS)].sum()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Amount", f"Rs. {totals['amount']:,.2f}")
+    with col2:
+        st.metric("Quantity", f"{totals['quantity']:,.2f}")
+    with col3:
+        st.metric("Transactions", f"{int(totals['count']):,}")
+    
+    labelled = label_members(result, names)
+    if columns_dimension:
+        pivot = labelled.pivot_table(
+            index=rows_dimension, columns=columns_dimension, values=measure, aggfunc="sum", fill_value=0, observed=True
+        )
+        pivot["Total"] = pivot.sum(axis=1)
+        pivot = pivot.sort_values("Total", ascending=False) if rows_dimension != "month" else pivot
+        pivot.index.name = DIMENSION_LABELS[rows_dimension]
+    else:
+        pivot = labelled.set_index(rows_dimension)[list(MEASURE_LABELS)]
+        if rows_dimension != "month":
+            pivot = pivot.sort_values(measure, ascending=False)
+        pivot.index.name = DIMENSION_LABELS[rows_dimension]
+        pivot.columns = [MEASURE_LABELS[m] for m in pivot.columns]
+    
+    st.dataframe(pivot, use_container_width=True, height=400)
+    st.caption(f"{len(result):,} rows from {len(transaction_cube.cells):,} cube cells in {elapsed * 1000:.0f} ms")
+    
+    # Chart of the rows by the measure, largest entries only
+    chart_data = labelled.groupby(rows_dimension, observed=True)[[measure]].sum().reset_index()
+    if rows_dimension == "month":
+        chart_data = charts.limit_points(chart_data, "month", how="sum")
+    else:
+        chart_data = charts.limit_categories(chart_data, rows_dimension, measure)
+    fig = px.bar(
+        chart_data,
+        x=rows_dimension,
+        y=measure,
+        title=f"{MEASURE_LABELS[measure]} by {DIMENSION_LABELS[rows_dimension]}",
+        labels={rows_dimension: DIMENSION_LABELS[rows_dimension], measure: MEASURE_LABELS[measure]}
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Drill into one member: it becomes a filter and the rows move to another dimension
+    members = result[rows_dimension].drop_duplicates().tolist()
+    next_dimensions = [d for d in dimensions if d != rows_dimension and d not in drilled]
+    if next_dimensions:
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            st.selectbox(
+                f"Drill into {DIMENSION_LABELS[rows_dimension].lower()}", members,
+                format_func=lambda value: member_label(rows_dimension, value, names), key="cube_member"
+            )
+        with col2:
+            st.selectbox(
+                "Then by", next_dimensions, format_func=DIMENSION_LABELS.get, key="cube_next"
+            )
+        with col3:
+            st.write("")
+            st.button("Drill down", key="cube_drill_down", on_click=drill_down, args=(rows_dimension,))
@@ -0,0 +1,118 @@
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import database
+import snapshot
+import storage
+import tenants
+
+# Trailing windows (days) over which outgoing velocity is measured
+FORECAST_WINDOWS = (7, 30, 90)
+
+# Weight of each window in the daily demand used for the forecast; recent weeks count most
+FORECAST_WEIGHTS = (0.5, 0.3, 0.2)
+
+# Days ahead for which a stock-out date is projected
+FORECAST_HORIZON = 365
+
+# Items that run out within this many days are at risk
+AT_RISK_DAYS = int(os.environ.get("AT_RISK_DAYS", "14"))
+
+OUT_OF_STOCK = "Out of stock"
+AT_RISK = "At risk"
+OK = "OK"
+NO_DEMAND = "No demand"
+
+def demand_matrix(demand, item_ids, first_day, days):
+    """Outgoing quantity as an item x day matrix, filled in one scatter"""
+    matrix = np.zeros((len(item_ids), days))
+    rows = pd.Index(item_ids).get_indexer(demand["item_id"])
+    columns = demand["day"].to_numpy(dtype=np.int64) - first_day
+    known = (rows >= 0) & (columns >= 0) & (columns < days)
+    # Unbuffered add, so repeated (item, day) pairs accumulate instead of overwriting
+    np.add.at(matrix, (rows[known], columns[known]), demand["quantity"].to_numpy(dtype=float)[known])
+    return matrix
+
+def window_velocities(matrix, windows=FORECAST_WINDOWS):
+    """Mean daily demand of every item over each trailing window, as an item x window array"""
+    # Running totals backwards from the last day give every window's sum in one pass
+    totals = np.cumsum(matrix[:, ::-1], axis=1)
+    lengths = np.minimum(np.array(windows), matrix.shape[1])
+    return totals[:, lengths - 1] / lengths
+
+def stock_forecast(stock, demand, as_of, windows=FORECAST_WINDOWS, weights=FORECAST_WEIGHTS,
+                   at_risk_days=AT_RISK_DAYS):
+    """Velocity, days of cover and projected stock-out date of every item"""
+    days = max(windows)
+    last_day = storage.date_to_day(as_of)
+    matrix = demand_matrix(demand, stock["item_id"].to_numpy(), last_day - days + 1, days)
+    velocities = window_velocities(matrix, windows)
+    daily_demand = velocities @ (np.array(weights) / np.sum(weights))
+
+    quantity = stock["quantity"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(daily_demand > 0, np.maximum(quantity, 0) / daily_demand, np.inf)
+
+    status = np.select(
+        [daily_demand <= 0, quantity <= 0, cover < at_risk_days],
+        [NO_DEMAND, OUT_OF_STOCK, AT_RISK],
+        OK
+    )
+    # Stock-out dates further out than the horizon say little, so they are left blank
+    projected = np.where(cover <= FORECAST_HORIZON, np.floor(cover), np.nan)
+    stockout = pd.Timestamp(as_of) + pd.to_timedelta(projected, unit="D")
+
+    forecast = stock[["item_id", "item_name", "unit", "quantity"]].copy()
+    for index, window in enumerate(windows):
+        forecast[f"velocity_{window}d"] = velocities[:, index]
+    forecast["daily_demand"] = daily_demand
+    forecast["days_of_cover"] = cover
+    forecast["stockout_date"] = stockout
+    forecast["status"] = status
+    return forecast.sort_values(["days_of_cover", "item_name"], kind="stable").reset_index(drop=True)
+
+def get_stock_forecast(as_of=None):
+    """Stock forecast of every item from the outgoing transactions up to a date (default today)"""
+    as_of = as_of or date.today().isoformat()
+    start = (date.fromisoformat(as_of) - timedelta(days=max(FORECAST_WINDOWS) - 1)).isoformat()
+    stock, demand = database.get_item_demand(start, as_of)
+    return stock_forecast(stock, demand, as_of)
+
+# Last forecast of each database, with the data generation and date it was computed for
+_forecasts = {}
+_forecasts_lock = threading.Lock()
+
+def get_cached_stock_forecast(as_of=None):
+    """Stock forecast of the current database, recomputed only once its data has changed or the day has turned"""
+    as_of = as_of or date.today().isoformat()
+    if snapshot.is_active():
+        generation = ("snapshot", snapshot.get_snapshot().refreshed_at, as_of)
+    else:
+        generation = ("live", database.get_data_version(), as_of)
+    path = tenants.current_path()
+
+    with _forecasts_lock:
+        cached = _forecasts.get(path)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    # The generation is read first, so a write during the computation causes another one next time
+    stock_forecast = get_stock_forecast(as_of)
+    with _forecasts_lock:
+        _forecasts[path] = (generation, stock_forecast)
+    return stock_forecast
+
+def reset_forecast(path):
+    """Drop a database's cached forecast"""
+    with _forecasts_lock:
+        _forecasts.pop(path, None)
+
+tenants.router.evict_callbacks.append(reset_forecast)
+
+def at_risk_items(forecast, limit=10):
+    """Items out of stock or running out within the at-risk horizon, soonest first"""
+    return forecast[forecast["status"].isin([OUT_OF_STOCK, AT_RISK])].head(limit)
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import database
+import utils
 
 def show_gatebook_entry():
     """Display the gatebook entry form for adding transactions"""
@@ -26,6 +27,25 @@ def show_gatebook_entry():
             st.rerun()
         return
     
+    # Vouchers enter several items for one party in a single save
+    entry_mode = st.radio(
+        "Entry Mode",
+        ["single", "voucher"],
+        format_func=lambda x: "Single Item" if x == "single" else "Voucher (Multiple Items)",
+        horizontal=True,
+        key="gatebook_entry_mode"
+    )
+    
+    if entry_mode == "voucher":
+        show_voucher_entry(parties, items)
+    else:
+        show_single_entry(parties, items)
+    
+    # Recent transactions
+    show_recent_transactions()
+
+def show_single_entry(parties, items):
+    """Display the form for adding a single transaction"""
     # Create the form
     with st.form("gatebook_entry_form"):
         st.subheader("Add New Transaction")
@@ -133,8 +153,111 @@ def show_gatebook_entry():
                 st.text(f"{key}: {value}")
         else:
             st.error(message)
+
+def show_voucher_entry(parties, items):
+    """Display the voucher form with an editable grid of item lines"""
+    item_names = dict(zip(items["name"], items["id"]))
     
-    # Recent transactions
+    # A new grid key after each saved voucher starts the next one empty
+    if "voucher_grid" not in st.session_state:
+        st.session_state.voucher_grid = 0
+    
+    with st.form("gatebook_voucher_form"):
+        st.subheader("Add New Voucher")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            voucher_date = st.date_input(
+                "Voucher Date",
+                value=datetime.now().date(),
+                max_value=datetime.now().date()
+            )
+            party_id = st.selectbox(
+                "Select Party",
+                options=parties["id"].tolist(),
+                format_func=lambda x: parties.loc[parties["id"] == x, "name"].iloc[0]
+            )
+        with col2:
+            transaction_type = st.radio(
+                "Transaction Type",
+                ["incoming", "outgoing"],
+                format_func=lambda x: "Incoming (Purchase)" if x == "incoming" else "Outgoing (Sale)"
+            )
+            reference = st.text_input("Gate Pass / Challan No. (Optional)")
+        
+        # Edits to the grid are sent together when the form is submitted
+        lines = st.data_editor(
+            pd.DataFrame({
+                "Item": pd.Series([None] * 5, dtype="object"),
+                "Quantity": pd.Series([None] * 5, dtype="float"),
+                "Rate": pd.Series([None] * 5, dtype="float"),
+                "Description": pd.Series([None] * 5, dtype="object")
+            }),
+            column_config={
+                "Item": st.column_config.SelectboxColumn("Item", options=list(item_names)),
+                "Quantity": st.column_config.NumberColumn("Quantity", min_value=0.01, step=0.01),
+                "Rate": st.column_config.NumberColumn("Rate (Rs.)", min_value=0.01, step=0.01, format="%.2f"),
+                "Description": st.column_config.TextColumn("Description")
+            },
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            key=f"voucher_lines_{st.session_state.voucher_grid}"
+        )
+        
+        description = st.text_area("Voucher Description (Optional)")
+        
+        submit_button = st.form_submit_button("Save Voucher")
+    
+    if not submit_button:
+        return
+    
+    # Blank rows are ignored; partly filled rows are errors
+    lines = lines.dropna(how="all", subset=["Item", "Quantity", "Rate"])
+    if lines.empty:
+        st.error("Add at least one item line.")
+        return
+    
+    incomplete = lines[lines[["Item", "Quantity", "Rate"]].isna().any(axis=1)]
+    if not incomplete.empty:
+        st.error("Every line needs an item, a quantity and a rate.")
+        return
+    
+    if (lines["Quantity"] <= 0).any() or (lines["Rate"] <= 0).any():
+        st.error("Quantities and rates must be greater than zero.")
+        return
+    
+    # Stock for all lines is checked together when the voucher is saved
+    success, message = database.add_voucher(
+        voucher_date.strftime("%Y-%m-%d"),
+        party_id,
+        transaction_type,
+        [
+            {
+                "item_id": item_names[row["Item"]],
+                "quantity": float(row["Quantity"]),
+                "rate": float(row["Rate"]),
+                "description": row["Description"] if pd.notna(row["Description"]) and row["Description"] else None
+            }
+            for _, row in lines.iterrows()
+        ],
+        reference=reference or None,
+        description=description or None
+    )
+    
+    if success:
+        st.session_state.voucher_grid += 1
+        st.success(message)
+        
+        # Display voucher details
+        summary = lines.assign(Amount=lines["Quantity"] * lines["Rate"])
+        st.dataframe(summary, use_container_width=True, hide_index=True)
+        st.info(f"Voucher Total: Rs. {summary['Amount'].sum():,.2f}")
+    else:
+        st.error(message)
+
+def show_recent_transactions():
+    """Display the latest transactions below the entry form"""
     st.subheader("Recent Transactions")
     recent_transactions = database.get_transactions()
     
@@ -151,6 +274,7 @@ def show_gatebook_entry():
         
         # Select columns to display
         display_cols = ["Date", "Party", "Item", "Quantity", "Unit", "Amount", "Type"]
-        st.dataframe(display_df[display_cols].head(10), use_container_width=True)
+        recent = display_df[display_cols].head(10)
+        st.dataframe(recent, use_container_width=True, column_config=utils.date_column_config(recent))
     else:
         st.info("No transactions to display")
@@ -2,7 +2,9 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
+import charts
 import database
+import utils
 
 def show_inventory_management():
     """Display the inventory management page"""
@@ -27,7 +29,7 @@ def show_inventory_management():
     st.subheader("Current Stock Levels")
     
     # Create a copy for display
-    display_df = inventory_data.copy()
+    display_df = inventory_data.drop(columns="row_version")
     
     # Rename columns
     display_df.columns = ["ID", "Item", "Unit", "Quantity", "Average Rate", "Value"]
@@ -50,9 +52,16 @@ def show_inventory_management():
     if len(inventory_data) > 0:
         st.subheader("Inventory Visualization")
         
+        # Largest items by value, the rest combined, so the charts stay small with thousands of items
+        chart_data = charts.limit_categories(
+            inventory_data[["item_name", "quantity", "value"]], "item_name", "value", sum_columns=["quantity"]
+        )
+        if len(chart_data) < len(inventory_data):
+            st.caption(f"Showing the top {len(chart_data) - 1} of {len(inventory_data):,} items by value; the rest are combined as Other")
+        
         # Create bar chart for quantities
         fig = px.bar(
-            inventory_data,
+            chart_data,
             x='item_name',
             y='quantity',
             title="Current Stock by Item",
@@ -72,7 +81,7 @@ def show_inventory_management():
         
         # Create pie chart for inventory value distribution
         fig_pie = px.pie(
-            inventory_data,
+            chart_data,
             names='item_name',
             values='value',
             title="Inventory Value Distribution",
@@ -96,7 +105,10 @@ def show_inventory_management():
         )
     
     with col2:
-        current_qty = inventory_data.loc[inventory_data['item_id'] == item_id, 'quantity'].iloc[0]
+        current = inventory_data.loc[inventory_data['item_id'] == item_id].iloc[0]
+        # The input starts from the stock first loaded, so it survives reruns and concurrent changes
+        loaded = utils.loaded_record("stock_edit", item_id, current[['quantity', 'row_version']])
+        current_qty = loaded['quantity']
         new_qty = st.number_input(
             f"New Quantity (Current: {current_qty})",
             min_value=0.0,
@@ -104,17 +116,60 @@ def show_inventory_management():
             step=0.01
         )
     
+    reason = st.text_input("Reason for Adjustment", value="Manual stock update")
+    
     update_button = st.button("Update Stock")
     
-    if update_button:
-        if new_qty == current_qty:
-            st.info("No change in quantity")
+    if update_button and new_qty == current_qty:
+        st.info("No change in quantity")
+    
+    utils.save_edit(
+        "stock_edit",
+        update_button and new_qty != current_qty,
+        lambda row_version: database.update_inventory(item_id, new_qty, reason or "Manual stock update", row_version),
+        int(loaded['row_version']),
+        int(current['row_version'])
+    )
+    
+    # Stock reconciliation against transactions and the adjustment journal
+    st.subheader("Stock Reconciliation")
+    st.caption("Compares stored stock with the stock implied by transactions and recorded adjustments")
+    
+    if st.button("Run Reconciliation"):
+        st.session_state.inventory_reconciliation = database.get_inventory_reconciliation()
+    
+    reconciliation = st.session_state.get("inventory_reconciliation")
+    if reconciliation is not None:
+        drifted = reconciliation[reconciliation["has_drift"]]
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Items Checked", len(reconciliation))
+        with col2:
+            st.metric("Items with Drift", len(drifted))
+        with col3:
+            st.metric("Net Drift (Qty)", f"{drifted['drift'].sum():,.2f}")
+        
+        if drifted.empty:
+            st.success("Stored stock matches transactions for every item")
         else:
-            success, message = database.update_inventory(item_id, new_qty)
+            drift_df = drifted[["item_name", "unit", "stored_quantity", "expected_quantity", "drift"]].copy()
+            drift_df.columns = ["Item", "Unit", "Stored", "Expected", "Drift"]
+            st.dataframe(
+                drift_df,
+                use_container_width=True,
+                column_config={
+                    "Stored": st.column_config.NumberColumn(format="%.2f"),
+                    "Expected": st.column_config.NumberColumn(format="%.2f"),
+                    "Drift": st.column_config.NumberColumn(format="%.2f")
+                }
+            )
             
-            if success:
-                st.success(message)
-                # Refresh the page
-                st.rerun()
-            else:
-                st.error(message)
\ No newline at end of file
+            if st.button("Record Drift as Adjustments"):
+                success, message = database.record_inventory_drift()
+                
+                if success:
+                    st.session_state.inventory_reconciliation = None
+                    st.success(message)
+                else:
+                    st.error(message)
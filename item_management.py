@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import database
+import utils
 
 def show_item_management():
     """Display the item management page"""
@@ -10,7 +11,7 @@ def show_item_management():
     # Get all items
     conn = database.get_connection()
     items_query = """
-    SELECT i.*, inv.quantity as current_stock
+    SELECT i.id, i.name, i.description, i.unit, i.created_at, inv.quantity as current_stock
     FROM items i
     LEFT JOIN inventory inv ON i.id = inv.item_id
     ORDER BY i.name
@@ -85,9 +86,12 @@ def show_item_management():
                 st.subheader("Edit Item")
                 
                 # Get the selected item details
-                item_details = database.get_item_details(item_id)
+                current_details = database.get_item_details(item_id)
                 
-                if item_details is not None:
+                if current_details is not None:
+                    # The form keeps the values first loaded, so its inputs survive reruns
+                    item_details = utils.loaded_record("item_edit", item_id, current_details)
+                    
                     with st.form("edit_item_form"):
                         name = st.text_input("Item Name*", value=item_details["name"])
                         description = st.text_area("Description", value=item_details["description"] if item_details["description"] else "")
@@ -95,19 +99,17 @@ def show_item_management():
                         
                         update_button = st.form_submit_button("Update Item")
                     
-                    if update_button:
-                        if not name:
-                            st.error("Item name is required")
-                        elif not unit:
-                            st.error("Unit of measurement is required")
-                        else:
-                            success, message = database.update_item(item_id, name, description, unit)
-                            
-                            if success:
-                                st.success(message)
-                                # Refresh the page to show updated data
-                                st.rerun()
-                            else:
-                                st.error(message)
+                    if update_button and not name:
+                        st.error("Item name is required")
+                    elif update_button and not unit:
+                        st.error("Unit of measurement is required")
+                    
+                    utils.save_edit(
+                        "item_edit",
+                        update_button and bool(name) and bool(unit),
+                        lambda row_version: database.update_item(item_id, name, description, unit, row_version),
+                        int(item_details["row_version"]),
+                        int(current_details["row_version"])
+                    )
                 else:
                     st.error(f"No item found with ID {item_id}")
\ No newline at end of file
@@ -0,0 +1,164 @@
+import contextvars
+import inspect
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import metrics
+import snapshot
+import tenants
+
+def export_transactions_csv(start_date=None, end_date=None, progress=None):
+    """Build a CSV export of the general ledger for a date range"""
+    progress(0.1, "Querying transactions")
+    transactions = database.get_transactions(start_date=start_date, end_date=end_date)
+    progress(0.6, f"Writing {len(transactions):,} rows")
+    return transactions.to_csv(index=False).encode("utf-8")
+
+# Long-running computations that pages can submit by name
+REPORTS = {
+    "party_ledger": database.get_party_ledger,
+    "item_ledger": database.get_item_ledger,
+    "general_ledger": database.get_transactions,
+    "balance_sheet": database.get_balance_sheet_data,
+    "receivables_aging": database.get_receivables_aging,
+    "balance_sheet_series": database.get_balance_sheet_series,
+    "transactions_csv": export_transactions_csv,
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class Job:
+    """A submitted report computation and its progress"""
+
+    def __init__(self, job_id, name, params, cache_key):
+        self.id = job_id
+        self.name = name
+        self.params = params
+        self.cache_key = cache_key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting to start"
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.cached = False
+
+    def set_progress(self, fraction, message=None):
+        """Report progress from inside the computation (0.0 to 1.0)"""
+        self.progress = max(0.0, min(1.0, fraction))
+        if message:
+            self.message = message
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+class JobRunner:
+    """Runs report computations on a thread pool and caches their results"""
+
+    def __init__(self, max_workers=2, cache_size=32, keep_finished=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self.cache_size = cache_size
+        self.keep_finished = keep_finished
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.pending = {}
+        self.results = OrderedDict()
+        self.ids = itertools.count(1)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def cache_key(self, name, params):
+        """Key results by report, parameters, database and data generation"""
+        if snapshot.is_active():
+            generation = ("snapshot", snapshot.get_snapshot().refreshed_at)
+        else:
+            generation = ("live", database.get_data_version())
+        return (name, tuple(sorted(params.items())), tenants.current_path(), generation)
+
+    def submit(self, name, params):
+        """Submit a report by name; returns a finished job on a cache hit"""
+        func = REPORTS[name]
+        key = self.cache_key(name, params)
+
+        with self.lock:
+            self._prune()
+
+            # Same report already computed for this data generation
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.cache_hits += 1
+                job = Job(next(self.ids), name, params, key)
+                job.status, job.progress, job.message = DONE, 1.0, "Loaded from cache"
+                job.result, job.cached, job.finished_at = self.results[key], True, time.time()
+                self.jobs[job.id] = job
+                return job
+
+            # Same report already running for another session; failures are
+            # not kept, so submitting again after one starts a new job
+            if key in self.pending:
+                return self.jobs[self.pending[key]]
+
+            self.cache_misses += 1
+            job = Job(next(self.ids), name, params, key)
+            self.jobs[job.id] = job
+            self.pending[key] = job.id
+
+        # Run in a copy of the caller's context so the company and snapshot choice carry over
+        context = contextvars.copy_context()
+        self.executor.submit(context.run, self._run, job, func)
+        return job
+
+    def _run(self, job, func):
+        job.status = RUNNING
+        job.message = "Running"
+        try:
+            kwargs = dict(job.params)
+            if "progress" in inspect.signature(func).parameters:
+                kwargs["progress"] = job.set_progress
+            result = func(**kwargs)
+        except Exception as e:
+            job.finished_at = time.time()
+            job.error = str(e)
+            job.status = FAILED
+            job.message = f"Failed: {e}"
+        else:
+            job.finished_at = time.time()
+            job.result = result
+            job.status = DONE
+            job.progress = 1.0
+            job.message = "Finished"
+            with self.lock:
+                self.results[job.cache_key] = result
+                while len(self.results) > self.cache_size:
+                    self.results.popitem(last=False)
+        finally:
+            with self.lock:
+                self.pending.pop(job.cache_key, None)
+
+    def get(self, job_id):
+        """Look up a job by id"""
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.keep_finished
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+runner = JobRunner()
+
+def report_cache_samples():
+    """Hits and misses of the shared report cache"""
+    return metrics.cache_samples("reports", runner.cache_hits, runner.cache_misses)
+
+metrics.registry.collectors.append(report_cache_samples)
@@ -3,6 +3,8 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
 import database
+import jobs
+import utils
 
 def format_currency(value):
     """Format a value as currency"""
@@ -27,7 +29,8 @@ def display_dataframe(df, height=400):
     return st.dataframe(
         df,
         use_container_width=True,
-        height=height
+        height=height,
+        column_config=utils.date_column_config(df)
     )
 
 def date_filter_ui():
@@ -59,11 +62,12 @@ def show_general_ledger():
     st.subheader("Filter Transactions")
     start_date, end_date = date_filter_ui()
     
-    # Get transactions
-    transactions = database.get_transactions(
-        start_date=start_date.strftime("%Y-%m-%d"),
-        end_date=end_date.strftime("%Y-%m-%d")
-    )
+    # Get transactions (optionally from the reporting snapshot)
+    with utils.report_source_selector("general_ledger_snapshot"):
+        transactions = database.get_transactions(
+            start_date=start_date.strftime("%Y-%m-%d"),
+            end_date=end_date.strftime("%Y-%m-%d")
+        )
     
     # Display data
     st.subheader(f"Transactions from {start_date} to {end_date}")
@@ -96,6 +100,25 @@ def show_general_ledger():
     # Display the dataframe
     st.subheader("Transaction Details")
     display_dataframe(display_df, height=500)
+    
+    # CSV export, prepared in the background for long periods
+    st.subheader("Export")
+    if st.toggle("Prepare CSV export", key="general_ledger_export"):
+        job = utils.submit_job("transactions_csv", {
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d")
+        }, "general_ledger_export")
+        if job.status == jobs.DONE:
+            st.download_button(
+                "Download CSV",
+                data=job.result,
+                file_name=f"general_ledger_{start_date}_{end_date}.csv",
+                mime="text/csv"
+            )
+        elif job.status == jobs.FAILED:
+            utils.show_job_failure(job, "general_ledger_export", "Export")
+        else:
+            utils.show_job_progress(job.id)
 
 def show_party_ledger():
     """Display the ledger for a specific party"""
@@ -119,12 +142,16 @@ def show_party_ledger():
     
     start_date, end_date = date_filter_ui()
     
-    # Get party ledger data
-    ledger_data = database.get_party_ledger(
-        party_id,
-        start_date=start_date.strftime("%Y-%m-%d"),
-        end_date=end_date.strftime("%Y-%m-%d")
-    )
+    # Get party ledger data (optionally from the reporting snapshot or in the background)
+    with utils.report_source_selector("party_ledger_snapshot"):
+        ledger_data = utils.run_report("party_ledger", {
+            "party_id": party_id,
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d")
+        }, key="party_ledger_background")
+    
+    if ledger_data is None:
+        return
     
     # Display party info
     party_name = parties.loc[parties["id"] == party_id, "name"].iloc[0]
@@ -186,12 +213,16 @@ def show_item_ledger():
     
     start_date, end_date = date_filter_ui()
     
-    # Get item ledger data
-    ledger_data = database.get_item_ledger(
-        item_id,
-        start_date=start_date.strftime("%Y-%m-%d"),
-        end_date=end_date.strftime("%Y-%m-%d")
-    )
+    # Get item ledger data (optionally from the reporting snapshot or in the background)
+    with utils.report_source_selector("item_ledger_snapshot"):
+        ledger_data = utils.run_report("item_ledger", {
+            "item_id": item_id,
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d")
+        }, key="item_ledger_background")
+    
+    if ledger_data is None:
+        return
     
     # Display item info
     item_name = items.loc[items["id"] == item_id, "name"].iloc[0]
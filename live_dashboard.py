@@ -0,0 +1,114 @@
+import threading
+import pandas as pd
+import columnar_store
+
+# Number of rows kept for the recent transactions table
+RECENT_LIMIT = 5
+
+class DashboardTotals:
+    """Running dashboard aggregates, updated by applying only newly added transactions"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.count = 0
+        self.daily = pd.DataFrame(columns=["incoming", "outgoing"], dtype=float)
+        self.item_totals = pd.Series(dtype=float)
+        self.party_totals = pd.Series(dtype=float)
+        self.type_counts = pd.Series(dtype="int64")
+        self.latest_rates = pd.DataFrame(columns=["day", "id", "rate"])
+        self.recent = pd.DataFrame()
+        self.closed_through = None  # year-end close the totals were built after
+
+    def apply(self, rows):
+        """Fold new transaction rows (id, day, party_id, item_id, quantity, rate, amount, transaction_type) in"""
+        if rows.empty:
+            return 0
+
+        self.count += len(rows)
+        self.last_id = int(rows["id"].max())
+
+        # Per-day incoming and outgoing amounts, so any date cutoff can be applied later
+        daily = rows.pivot_table(
+            index="day", columns="transaction_type", values="amount", aggfunc="sum", fill_value=0.0
+        ).reindex(columns=["incoming", "outgoing"], fill_value=0.0)
+        self.daily = daily if self.daily.empty else self.daily.add(daily, fill_value=0.0)
+
+        self.item_totals = self.item_totals.add(rows.groupby("item_id")["amount"].sum(), fill_value=0.0)
+        self.party_totals = self.party_totals.add(rows.groupby("party_id")["amount"].sum(), fill_value=0.0)
+        self.type_counts = self.type_counts.add(rows["transaction_type"].value_counts(), fill_value=0).astype("int64")
+
+        # Latest incoming rate per item, by date then id
+        incoming = rows.loc[rows["transaction_type"] == "incoming", ["item_id", "day", "id", "rate"]]
+        if not incoming.empty:
+            rates = pd.concat([self.latest_rates.reset_index(), incoming]) if not self.latest_rates.empty else incoming
+            self.latest_rates = (
+                rates.sort_values(["day", "id"]).groupby("item_id")[["day", "id", "rate"]].last()
+            )
+
+        recent = pd.concat([rows, self.recent]) if not self.recent.empty else rows
+        self.recent = recent.nlargest(RECENT_LIMIT, "id")
+        return len(rows)
+
+    def monthly_totals(self, since_day):
+        """Incoming and outgoing amounts per month from the given day onwards"""
+        daily = self.daily[self.daily.index >= since_day]
+        if daily.empty:
+            return pd.DataFrame(columns=["month", "incoming", "outgoing"])
+
+        months = columnar_store.month_label(columnar_store.day_to_month(daily.index.to_numpy(dtype="int64")))
+        monthly = daily.groupby(months).sum()
+        return pd.DataFrame({
+            "month": monthly.index,
+            "incoming": monthly["incoming"].to_numpy(),
+            "outgoing": monthly["outgoing"].to_numpy()
+        })
+
+    def top_totals(self, totals, names, name_column, limit=5):
+        """Top ids by total transaction amount, labelled with their names"""
+        top = totals.sort_values(ascending=False, kind="stable").head(limit)
+        return pd.DataFrame({
+            name_column: [names.get(int(i)) for i in top.index],
+            "total_value": top.to_numpy()
+        })
+
+    def transaction_types(self):
+        """Number of transactions per type"""
+        counts = self.type_counts[self.type_counts > 0]
+        return pd.DataFrame({"transaction_type": counts.index, "count": counts.to_numpy()})
+
+    def inventory_value(self, quantities, opening_rates=None):
+        """Stock value at each item's latest incoming rate (else its opening rate), given item_id -> quantity"""
+        rates = self.latest_rates["rate"].astype(float) if not self.latest_rates.empty else pd.Series(dtype=float)
+        if opening_rates is not None and not opening_rates.empty:
+            rates = rates.combine_first(opening_rates.dropna().astype(float))
+        if rates.empty:
+            return 0
+        return float((quantities.reindex(rates.index) * rates).sum())
+
+    def recent_transactions(self, party_names, item_names):
+        """Latest transactions, newest first, with party and item names"""
+        columns = ["transaction_date", "party_name", "item_name", "quantity", "rate", "amount", "transaction_type"]
+        if self.recent.empty:
+            return pd.DataFrame(columns=columns)
+
+        recent = self.recent.assign(
+            party_name=self.recent["party_id"].map(party_names),
+            item_name=self.recent["item_id"].map(item_names)
+        )
+        return recent[columns].reset_index(drop=True)
+
+_totals = {}
+_totals_lock = threading.Lock()
+
+def get_totals(key):
+    """Return the process-wide running totals for a database, creating them on first use"""
+    with _totals_lock:
+        if key not in _totals:
+            _totals[key] = DashboardTotals()
+        return _totals[key]
+
+def reset_totals(key):
+    """Drop a database's running totals so they are rebuilt on next use"""
+    with _totals_lock:
+        _totals.pop(key, None)
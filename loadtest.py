@@ -0,0 +1,199 @@
+import argparse
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import backup
+import benchmark
+import metrics
+import tenants
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Seconds AppTest waits for one script run before failing it
+RUN_TIMEOUT = 120
+
+def current_rss():
+    """Resident memory of this process in MB"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        # Peak rather than current, where /proc is not available (reported in KB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+class SessionStats:
+    """Rerun latencies and failures collected from every session thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = 0
+        self.failed_sessions = 0
+        self.lock_errors = 0
+        self.saved = 0
+
+    def record(self, step, seconds, app):
+        """Record one rerun, counting script exceptions and 'database is locked' failures"""
+        messages = [str(e.value) for e in app.exception] + [str(e.value) for e in app.error]
+        with self.lock:
+            self.latencies.setdefault(step, []).append(seconds)
+            self.errors += len(app.exception)
+            self.lock_errors += sum("database is locked" in message for message in messages)
+            self.saved += sum("added successfully" in str(s.value) for s in app.success)
+
+def share_test_runtime():
+    """Let AppTest sessions run on several threads at once"""
+    # Each AppTest run installs a mock Runtime singleton and clears it when it
+    # finishes, which would break runs still going on other threads. Fall back
+    # to a mock of the same shape whenever no run has one installed.
+    from unittest.mock import MagicMock
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    fallback = MagicMock(spec=Runtime)
+    fallback.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    fallback.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or fallback)
+
+    # Every AppTest compiles the script into its own cache, and compiling on
+    # several threads at once trips a CPython 3.11 parser bug. Share one cache,
+    # as a real server does across its sessions.
+    shared_cache = ScriptCache()
+    compile_lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def get_shared_bytecode(self, script_path):
+        with compile_lock:
+            return get_bytecode(shared_cache, script_path)
+
+    ScriptCache.get_bytecode = get_shared_bytecode
+
+def button(app, label):
+    """The button with a given label (form submit buttons have no key)"""
+    return next(b for b in app.button if b.label == label)
+
+def run_session(stats, parties, rng, ledger_views=3):
+    """One scripted user: log in, enter a gatebook transaction, browse ledgers, view the dashboard"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT)
+
+    def step(name, action=None):
+        if action:
+            action()
+        started = time.perf_counter()
+        app.run()
+        stats.record(name, time.perf_counter() - started, app)
+
+    step("login page")
+    app.text_input(key="login_username").input("admin")
+    app.text_input(key="login_password").input("admin123")
+    step("login", lambda: button(app, "Login").click())
+
+    step("gatebook", lambda: app.button(key="Gatebook Entry").click())
+
+    def fill_entry():
+        app.selectbox[0].set_value(rng.randint(1, parties))
+        app.number_input[0].set_value(round(rng.uniform(1, 20), 2))
+        app.number_input[1].set_value(round(rng.uniform(10, 500), 2))
+        button(app, "Add Transaction").click()
+    step("gatebook submit", fill_entry)
+
+    step("party ledger", lambda: app.button(key="Party Ledger").click())
+    for _ in range(ledger_views):
+        step("party ledger select", lambda: app.selectbox[0].set_value(rng.randint(1, parties)))
+
+    step("dashboard", lambda: app.button(key="Dashboard").click())
+
+def run_level(concurrency, sessions, parties, seed):
+    """Run sessions spread over a number of threads, returning the stats and wall time"""
+    stats = SessionStats()
+    per_thread = [sessions // concurrency + (i < sessions % concurrency) for i in range(concurrency)]
+
+    def worker(index, count):
+        rng = random.Random(seed + index)
+        for _ in range(count):
+            try:
+                run_session(stats, parties, rng)
+            except Exception:
+                # A page that failed to render leaves widgets missing for the next step
+                with stats.lock:
+                    stats.failed_sessions += 1
+
+    threads = [threading.Thread(target=worker, args=(i, count)) for i, count in enumerate(per_thread)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - started
+
+def lock_metrics():
+    """Write lock retries and total lock wait so far, from the metrics registry"""
+    counters, histograms = metrics.registry.counters, metrics.registry.histograms
+    retries = counters.get(("database_locked_retries_total", ()), 0)
+    wait = histograms.get(("write_lock_wait_seconds", ()), [None, 0, 0.0])
+    return retries, wait[1], wait[2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive app.py with concurrent scripted AppTest sessions")
+    parser.add_argument("--levels", default="1,2,4,8", help="comma separated thread counts")
+    parser.add_argument("--sessions", type=int, default=8, help="sessions per concurrency level")
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--parties", type=int, default=200)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", help="Existing database to use instead of generating one")
+    args = parser.parse_args()
+
+    path = args.database
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(), "loadtest.db")
+        started = time.perf_counter()
+        benchmark.generate_database(path, args.parties, args.items, args.transactions)
+        print(f"generated {args.transactions} transactions in {time.perf_counter() - started:.1f} s")
+    tenants.DEFAULT_DATABASE = os.path.abspath(path)
+
+    # Keep background work of the app out of the measurements
+    backup.scheduler.interval = 0
+    metrics.server.port = 0
+
+    share_test_runtime()
+
+    # One warm-up session so imports and first-use caches are not charged to the first level
+    run_session(SessionStats(), args.parties, random.Random(args.seed))
+    baseline_rss = current_rss()
+    print(f"baseline memory {baseline_rss:.0f} MB")
+
+    print(f"{'threads':>7} {'reruns':>7} {'reruns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'failed':>6} {'locked':>6} {'retries':>7} {'lock wait ms':>12} {'saved':>5} {'RSS MB':>7}")
+    for concurrency in [int(level) for level in args.levels.split(",")]:
+        retries_before, waits_before, wait_before = lock_metrics()
+        stats, elapsed = run_level(concurrency, args.sessions, args.parties, args.seed)
+        retries_after, waits_after, wait_after = lock_metrics()
+
+        latencies = np.concatenate([np.array(values) for values in stats.latencies.values()]) * 1000
+        waits = waits_after - waits_before
+        mean_wait = (wait_after - wait_before) * 1000 / waits if waits else 0.0
+        print(f"{concurrency:>7} {len(latencies):>7} {len(latencies) / elapsed:>9.1f} "
+              f"{np.percentile(latencies, 50):>8.0f} {np.percentile(latencies, 95):>8.0f} "
+              f"{np.percentile(latencies, 99):>8.0f} {stats.errors:>6} {stats.failed_sessions:>6} {stats.lock_errors:>6} "
+              f"{retries_after - retries_before:>7} {mean_wait:>12.1f} {stats.saved:>5} "
+              f"{current_rss() - baseline_rss:>+7.0f}")
+
+    # Slowest steps at the last level, to see where the time goes
+    print("p95 by step at the highest concurrency:")
+    for step, values in sorted(stats.latencies.items(), key=lambda item: -np.percentile(item[1], 95)):
+        print(f"  {step:<22} {np.percentile(np.array(values) * 1000, 95):8.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import contextlib
+import functools
+import inspect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dimension_cache
+import tenants
+
+# Address of the metrics endpoint (port 0 disables it)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9108"))
+
+# A session counts as active if it ran a script within this many seconds
+SESSION_TIMEOUT = int(os.environ.get("METRICS_SESSION_TIMEOUT", "900"))
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = "business_"
+
+DESCRIPTIONS = {
+    "page_requests_total": ("counter", "Script runs per page"),
+    "page_errors_total": ("counter", "Page runs that raised"),
+    "page_duration_seconds": ("histogram", "Time to render a page"),
+    "query_calls_total": ("counter", "Calls per database function"),
+    "query_errors_total": ("counter", "Database function calls that raised"),
+    "query_duration_seconds": ("histogram", "Time spent in a database function"),
+    "write_lock_wait_seconds": ("histogram", "Time to acquire the database write lock"),
+    "database_locked_retries_total": ("counter", "Write lock attempts that failed with 'database is locked'"),
+    "edit_conflicts_total": ("counter", "Edits rejected because the row changed after it was loaded"),
+    "cache_hits_total": ("counter", "Cache lookups served from memory"),
+    "cache_misses_total": ("counter", "Cache lookups that had to load or compute"),
+    "cache_hit_ratio": ("gauge", "Share of cache lookups served from memory"),
+    "active_sessions": ("gauge", "Browser sessions that ran a script recently"),
+    "database_size_bytes": ("gauge", "Size of an open database file"),
+}
+
+def format_labels(labels):
+    """Prometheus label set for a sorted tuple of (name, value) pairs"""
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+class Registry:
+    """Counters and histograms kept in memory and rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.sessions = {}
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(BUCKETS), 0, 0.0]
+            counts = histogram[0]
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    counts[index] += 1
+            histogram[1] += 1
+            histogram[2] += seconds
+
+    def touch_session(self, session_id):
+        """Note that a session has just run a script"""
+        with self.lock:
+            self.sessions[session_id] = time.monotonic()
+
+    def active_sessions(self):
+        """Number of sessions seen within the timeout, forgetting older ones"""
+        cutoff = time.monotonic() - SESSION_TIMEOUT
+        with self.lock:
+            for session_id in [s for s, seen in self.sessions.items() if seen < cutoff]:
+                del self.sessions[session_id]
+            return len(self.sessions)
+
+    def samples(self):
+        """Every (name, labels, value) sample, including those from collectors"""
+        with self.lock:
+            samples = [(name, labels, value) for (name, labels), value in self.counters.items()]
+            for (name, labels), (counts, count, total) in self.histograms.items():
+                for bound, bucket_count in zip(BUCKETS, counts):
+                    samples.append((f"{name}_bucket", labels + (("le", repr(bound)),), bucket_count))
+                samples.append((f"{name}_bucket", labels + (("le", "+Inf"),), count))
+                samples.append((f"{name}_sum", labels, total))
+                samples.append((f"{name}_count", labels, count))
+
+        samples.append(("active_sessions", (), self.active_sessions()))
+        for collector in self.collectors:
+            samples.extend((name, tuple(sorted(labels.items())), value) for name, labels, value in collector())
+        return samples
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        families = {}
+        for name, labels, value in self.samples():
+            family = name
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name.endswith(suffix) and name[:-len(suffix)] in DESCRIPTIONS:
+                    family = name[:-len(suffix)]
+            families.setdefault(family, []).append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            metric_type, description = DESCRIPTIONS.get(family, ("untyped", family))
+            lines.append(f"# HELP {PREFIX}{family} {description}")
+            lines.append(f"# TYPE {PREFIX}{family} {metric_type}")
+            for name, labels, value in sorted(families[family], key=lambda sample: (sample[0], sample[1])):
+                lines.append(f"{PREFIX}{name}{format_labels(labels)} {float(value):.17g}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+touch_session = registry.touch_session
+
+@contextlib.contextmanager
+def timed(counter, histogram, errors=None, **labels):
+    """Count a block under one metric and record its duration in a histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if errors:
+            registry.inc(errors, **labels)
+        raise
+    finally:
+        registry.inc(counter, **labels)
+        registry.observe(histogram, time.perf_counter() - started, **labels)
+
+def track_query(func):
+    """Count calls to a database function and time them (generators are timed while iterated)"""
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            with timed("query_calls_total", "query_duration_seconds", "query_errors_total", function=func.__name__):
+                yield from func(*args, **kwargs)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with timed("query_calls_total", "query_duration_seconds", "query_errors_total", function=func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+def cache_samples(cache, hits, misses):
+    """Hit and miss counters of a cache plus its hit ratio"""
+    lookups = hits + misses
+    return [
+        ("cache_hits_total", {"cache": cache}, hits),
+        ("cache_misses_total", {"cache": cache}, misses),
+        ("cache_hit_ratio", {"cache": cache}, hits / lookups if lookups else 0.0)
+    ]
+
+def dimension_cache_samples():
+    """Hits and loads of the parties and items caches, over every open database"""
+    hits, loads = dimension_cache.cache_stats()
+    return cache_samples("dimensions", hits, loads)
+
+def database_size_samples():
+    """Size of each open database file"""
+    samples = []
+    for path in tenants.router.open_paths():
+        try:
+            samples.append(("database_size_bytes", {"database": path}, os.path.getsize(path)))
+        except OSError:
+            continue
+    return samples
+
+registry.collectors.extend([dimension_cache_samples, database_size_samples])
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the registry on /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise be logged to stderr every few seconds
+        pass
+
+class MetricsServer:
+    """Metrics endpoint on a daemon thread, started once per process"""
+
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT):
+        self.host = host
+        self.port = port
+        self.lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Start serving, unless disabled or already started"""
+        with self.lock:
+            if self._thread is not None or self.port <= 0:
+                return
+            try:
+                self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+            except OSError:
+                # Another process (e.g. a second app instance) already serves this port
+                self.port = 0
+                return
+            self._server.daemon_threads = True
+            self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop serving"""
+        with self.lock:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+            self._server = None
+            self._thread = None
+
+server = MetricsServer()
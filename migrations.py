@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import changefeed
+import columnar_store
+import cube
+import live_dashboard
+import tenants
+
+# Rows a backfill processes per committed batch, and seconds it sleeps between batches
+BACKFILL_BATCH = int(os.environ.get("BACKFILL_BATCH", "2000"))
+BACKFILL_PAUSE = float(os.environ.get("BACKFILL_PAUSE", "0.05"))
+
+# Run backfills on a background thread when a database is first opened (0 leaves them to the command line)
+BACKFILL_IN_BACKGROUND = os.environ.get("BACKFILL_IN_BACKGROUND", "1") == "1"
+
+# Tables whose rows carry a version for optimistic concurrency on edits
+VERSIONED_TABLES = ("parties", "items", "inventory")
+
+MIGRATIONS_TABLE = '''
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+BACKFILLS_TABLE = '''
+CREATE TABLE IF NOT EXISTS schema_backfills (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0, -- rows up to this id have been processed
+    target_id INTEGER NOT NULL, -- last row that existed when the backfill was registered
+    rows_changed INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+)
+'''
+
+def add_transaction_date_index(conn):
+    """Index transactions by date for date-range reports and the general ledger"""
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_transactions_date
+    ON transactions (transaction_date, id)
+    ''')
+
+def register_backfill(conn, name, table):
+    """Queue a backfill over the rows a table has now (newer rows are written correctly by the app)"""
+    target_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    conn.execute(
+        "INSERT OR IGNORE INTO schema_backfills (name, target_id) VALUES (?, ?)",
+        (name, target_id)
+    )
+
+def add_row_versions(conn):
+    """Add the version column that edits of parties, items and stock check and increment"""
+    for table in VERSIONED_TABLES:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0")
+
+def log_changes_for_subscribers(conn):
+    """Recreate the change log triggers so they skip logging while nobody subscribes"""
+    for table in changefeed.TRACKED_TABLES:
+        changefeed.drop_triggers(conn, table)
+        changefeed.create_triggers(conn, table)
+
+# Schema changes in the order they are applied; each runs once per database, in one transaction
+# (version 2 was withdrawn; databases that recorded it keep the row, and the number is not reused)
+MIGRATIONS = [
+    (1, "Index transactions by date", add_transaction_date_index),
+    (3, "Create the cube cells table", cube.create_cube_table),
+    (4, "Add row versions to parties, items and inventory", add_row_versions),
+    (5, "Log changes only while a subscriber exists", log_changes_for_subscribers),
+]
+
+# Batch functions of the backfills that migrations queue with register_backfill, by name
+BACKFILLS = {}
+
+def applied_versions(conn):
+    """Versions already applied to a database"""
+    return {version for (version,) in conn.execute("SELECT version FROM schema_migrations")}
+
+def migrate(conn):
+    """Apply pending migrations to a database, returning the versions applied"""
+    conn.execute(MIGRATIONS_TABLE)
+    conn.execute(BACKFILLS_TABLE)
+    conn.commit()
+
+    pending = [m for m in MIGRATIONS if m[0] not in applied_versions(conn)]
+    applied = []
+    for version, name, func in pending:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while this one waited for the lock
+            if version not in applied_versions(conn):
+                func(conn)
+                conn.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+def pending_backfills(conn):
+    """Names of the backfills that have not completed (ones this code no longer knows are left alone)"""
+    return [name for (name,) in conn.execute(
+        "SELECT name FROM schema_backfills WHERE completed_at IS NULL ORDER BY started_at, name"
+    ) if name in BACKFILLS]
+
+def run_backfill_batch(conn, name, batch_size=BACKFILL_BATCH):
+    """Process the next batch of a backfill in its own transaction, returning True once it is complete"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        last_id, target_id = conn.execute(
+            "SELECT last_id, target_id FROM schema_backfills WHERE name = ?", (name,)
+        ).fetchone()
+        batch_end = min(last_id + batch_size, target_id)
+        changed = BACKFILLS[name](conn, last_id + 1, batch_end) if batch_end > last_id else 0
+        done = batch_end >= target_id
+        conn.execute(
+            f"""UPDATE schema_backfills
+            SET last_id = ?, rows_changed = rows_changed + ?{", completed_at = CURRENT_TIMESTAMP" if done else ""}
+            WHERE name = ?""",
+            (batch_end, changed, name)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # Caches of this process assume stored rows never change
+    if changed:
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+        columnar_store.reset_store(path)
+        live_dashboard.reset_totals(path)
+    return done
+
+def run_backfills(conn, batch_size=BACKFILL_BATCH, pause=BACKFILL_PAUSE, stop=None):
+    """Run every pending backfill to completion, pausing between batches so the app's writes get through"""
+    for name in pending_backfills(conn):
+        while not run_backfill_batch(conn, name, batch_size):
+            if stop is not None and stop.wait(pause):
+                return False
+            if stop is None:
+                time.sleep(pause)
+    return True
+
+class BackfillRunner:
+    """Runs a database's pending backfills on a daemon thread, one thread per database"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.threads = {}
+        self._stop = threading.Event()
+
+    def start(self, path):
+        """Start backfilling a database unless a thread is already at it"""
+        with self.lock:
+            thread = self.threads.get(path)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(target=self._run, args=(path,), name="schema-backfill", daemon=True)
+            self.threads[path] = thread
+            thread.start()
+
+    def _run(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            while not self._stop.is_set():
+                try:
+                    if run_backfills(conn, stop=self._stop):
+                        return
+                except sqlite3.OperationalError as e:
+                    # A busy app holds the write lock; progress is saved, so try again shortly
+                    if "database is locked" not in str(e):
+                        raise
+                    self._stop.wait(1)
+        finally:
+            conn.close()
+
+    def stop(self):
+        """Stop every backfill after its current batch"""
+        self._stop.set()
+
+runner = BackfillRunner()
+
+def main():
+    """Apply pending migrations to a database and run its backfills to completion"""
+    if len(sys.argv) > 2:
+        print("usage: python migrations.py [DATABASE]")
+        return 2
+
+    path = sys.argv[1] if len(sys.argv) > 1 else tenants.company_path()
+    if not os.path.exists(path):
+        print(f"{path} does not exist")
+        return 1
+
+    conn = sqlite3.connect(path)
+    try:
+        started = time.perf_counter()
+        applied = migrate(conn)
+        names = dict((version, name) for version, name, _ in MIGRATIONS)
+        for version in applied:
+            print(f"applied {version}: {names[version]}")
+
+        pending = pending_backfills(conn)
+        run_backfills(conn, pause=0)
+        for name in pending:
+            rows = conn.execute("SELECT rows_changed FROM schema_backfills WHERE name = ?", (name,)).fetchone()[0]
+            print(f"backfilled {name}: {rows} rows changed")
+
+        version = max(applied_versions(conn), default=0)
+        print(f"{path} is at schema version {version} ({time.perf_counter() - started:.1f} s)")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import database
+import utils
 
 def show_party_management():
     """Display the party management page"""
@@ -9,7 +10,7 @@ def show_party_management():
     
     # Get all parties
     conn = database.get_connection()
-    parties_query = "SELECT * FROM parties ORDER BY name"
+    parties_query = "SELECT id, name, contact_person, phone, email, address, created_at FROM parties ORDER BY name"
     parties = pd.read_sql_query(parties_query, conn)
     conn.close()
     
@@ -76,9 +77,12 @@ def show_party_management():
                 st.subheader("Edit Party")
                 
                 # Get the selected party details
-                party_details = database.get_party_details(party_id)
+                current_details = database.get_party_details(party_id)
                 
-                if party_details is not None:
+                if current_details is not None:
+                    # The form keeps the values first loaded, so its inputs survive reruns
+                    party_details = utils.loaded_record("party_edit", party_id, current_details)
+                    
                     with st.form("edit_party_form"):
                         name = st.text_input("Party Name*", value=party_details["name"])
                         contact_person = st.text_input("Contact Person", value=party_details["contact_person"] if party_details["contact_person"] else "")
@@ -88,17 +92,17 @@ def show_party_management():
                         
                         update_button = st.form_submit_button("Update Party")
                     
-                    if update_button:
-                        if not name:
-                            st.error("Party name is required")
-                        else:
-                            success, message = database.update_party(party_id, name, contact_person, phone, email, address)
-                            
-                            if success:
-                                st.success(message)
-                                # Refresh the page to show updated data
-                                st.rerun()
-                            else:
-                                st.error(message)
+                    if update_button and not name:
+                        st.error("Party name is required")
+                    
+                    utils.save_edit(
+                        "party_edit",
+                        update_button and bool(name),
+                        lambda row_version: database.update_party(
+                            party_id, name, contact_person, phone, email, address, row_version
+                        ),
+                        int(party_details["row_version"]),
+                        int(current_details["row_version"])
+                    )
                 else:
                     st.error(f"No party found with ID {party_id}")
\ No newline at end of file
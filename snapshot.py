@@ -0,0 +1,175 @@
+import contextlib
+import contextvars
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+import tenants
+
+# Snapshots are kept as a file next to the live database unless set to "memory"
+SNAPSHOT_MODE = os.environ.get("REPORT_SNAPSHOT_MODE", "file")
+SNAPSHOT_INTERVAL = int(os.environ.get("REPORT_SNAPSHOT_INTERVAL", "300"))
+
+# Whether report queries in this context should read from the snapshot
+_use_snapshot = contextvars.ContextVar("use_snapshot", default=False)
+
+_memory_names = itertools.count(1)
+
+class BackupRestarted(Exception):
+    """Raised when writers keep restarting a stepped backup"""
+
+def copy_database(source, target, pages=256, pause=0.0, max_restarts=3):
+    """Copy a database with the backup API in small page steps"""
+    # The source is unlocked between steps so writers are not stalled; if
+    # writers keep restarting the copy it is finished in a single step
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > max_restarts:
+                raise BackupRestarted()
+        state["remaining"] = remaining
+        if pause and remaining:
+            time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    except BackupRestarted:
+        source.backup(target, pages=-1)
+
+class ReportSnapshot:
+    """Read-only copy of a company database for long-running reports"""
+
+    def __init__(self, source_path, mode=SNAPSHOT_MODE, interval=SNAPSHOT_INTERVAL):
+        self.source_path = source_path
+        self.mode = mode
+        self.interval = interval
+        self.snapshot_path = source_path + ".snapshot"
+        self.lock = threading.Lock()
+        self.refreshed_at = None
+        self.duration = None
+        self._memory_uri = None
+        self._memory_anchor = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self, force=True):
+        """Copy the live database into a new snapshot and swap it in"""
+        with self.lock:
+            if not force and self.refreshed_at is not None:
+                return
+            started = time.time()
+            source = sqlite3.connect(self.source_path)
+            try:
+                if self.mode == "memory":
+                    self._refresh_memory(source)
+                else:
+                    self._refresh_file(source)
+            finally:
+                source.close()
+            self.refreshed_at = started
+            self.duration = time.time() - started
+
+    def _refresh_file(self, source):
+        """Build the snapshot in a temporary file, then atomically replace the old one"""
+        temporary_path = self.snapshot_path + ".tmp"
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+        target = sqlite3.connect(temporary_path)
+        try:
+            copy_database(source, target)
+        finally:
+            target.close()
+
+        # Readers of the previous snapshot keep their open file until they close
+        os.replace(temporary_path, self.snapshot_path)
+
+    def _refresh_memory(self, source):
+        """Build the snapshot in a new shared in-memory database, then swap it in"""
+        uri = f"file:report_snapshot_{next(_memory_names)}?mode=memory&cache=shared"
+        anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        copy_database(source, anchor)
+
+        # The old in-memory database is freed once its last reader closes
+        previous, self._memory_anchor, self._memory_uri = self._memory_anchor, anchor, uri
+        if previous is not None:
+            previous.close()
+
+    def connect(self):
+        """Open a read-only connection to the latest snapshot"""
+        self.refresh(force=False)
+
+        if self.mode == "memory":
+            conn = sqlite3.connect(self._memory_uri, uri=True)
+        else:
+            conn = sqlite3.connect(f"file:{self.snapshot_path}?mode=ro", uri=True)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def age(self):
+        """Seconds since the snapshot was taken, or None if it has not been taken yet"""
+        if self.refreshed_at is None:
+            return None
+        return time.time() - self.refreshed_at
+
+    def start(self):
+        """Refresh the snapshot periodically on a daemon thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="report-snapshot", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            age = self.age()
+            if age is None or age >= self.interval:
+                try:
+                    self.refresh()
+                except sqlite3.Error:
+                    pass  # try again on the next tick
+            self._stop.wait(min(self.interval, 30))
+
+    def stop(self):
+        """Stop the refresh thread and release the snapshot"""
+        self._stop.set()
+        if self._memory_anchor is not None:
+            self._memory_anchor.close()
+            self._memory_anchor = None
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def get_snapshot(source_path=None):
+    """Return the process-wide snapshot of a database, starting its refresh thread"""
+    source_path = source_path or tenants.current_path()
+    with _snapshots_lock:
+        report_snapshot = _snapshots.get(source_path)
+        if report_snapshot is None:
+            report_snapshot = ReportSnapshot(source_path)
+            _snapshots[source_path] = report_snapshot
+            report_snapshot.start()
+    return report_snapshot
+
+def drop_snapshot(source_path):
+    """Stop and forget a database's snapshot"""
+    with _snapshots_lock:
+        report_snapshot = _snapshots.pop(source_path, None)
+    if report_snapshot is not None:
+        report_snapshot.stop()
+
+@contextlib.contextmanager
+def use_snapshot():
+    """Serve connections opened in this block from the current company's snapshot"""
+    token = _use_snapshot.set(True)
+    try:
+        yield get_snapshot()
+    finally:
+        _use_snapshot.reset(token)
+
+def is_active():
+    """Whether connections in this context should come from the snapshot"""
+    return _use_snapshot.get()
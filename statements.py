@@ -0,0 +1,234 @@
+import argparse
+import csv
+import html
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+import database
+import tenants
+
+# Processes rendering statement files (default: one per CPU)
+STATEMENT_WORKERS = int(os.environ.get("STATEMENT_WORKERS", "0")) or os.cpu_count() or 1
+
+FORMATS = ("csv", "html", "pdf")
+
+# Statement columns: headings, and the fixed-width layout of the text and PDF versions
+HEADINGS = ("Date", "Item", "Quantity", "Unit", "Rate", "Debit", "Credit", "Balance", "Description")
+TEXT_LAYOUT = "{:<10}  {:<24}  {:>10}  {:<6}  {:>10}  {:>14}  {:>14}  {:>15}  {}"
+
+# Plain-text PDF layout: A4 landscape in 8 pt Courier
+PDF_PAGE_WIDTH = 842
+PDF_PAGE_HEIGHT = 595
+PDF_LINES_PER_PAGE = 50
+
+def last_month():
+    """First and last day of the previous calendar month"""
+    end = date.today().replace(day=1) - timedelta(days=1)
+    return end.replace(day=1).isoformat(), end.isoformat()
+
+def file_stem(party_id, name):
+    """File name (without extension) of a party's statement"""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", str(name)).strip("_")
+    return f"{party_id:05d}_{slug or 'party'}"
+
+def partition(ledger_data):
+    """Row ranges of each party in a ledger sorted by party, as {party_id: (start, stop)}"""
+    party_ids = ledger_data["party_id"].to_numpy()
+    if len(party_ids) == 0:
+        return {}
+    starts = np.flatnonzero(np.r_[True, party_ids[1:] != party_ids[:-1]])
+    stops = np.r_[starts[1:], len(party_ids)]
+    return {int(party_ids[start]): (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+def ledger_records(ledger_data):
+    """Ledger rows as plain (date, item, quantity, unit, rate, debit, credit, description) tuples"""
+    # Workers format a few rows per statement, which plain tuples do much faster than DataFrames
+    columns = [
+        ledger_data["transaction_date"].dt.strftime("%Y-%m-%d"),
+        ledger_data["item_name"], ledger_data["quantity"], ledger_data["unit"], ledger_data["rate"],
+        ledger_data["debit"], ledger_data["credit"], ledger_data["description"]
+    ]
+    return list(zip(*(column.astype(object).where(column.notna(), None).tolist() for column in columns)))
+
+def statement_rows(records, brought_forward, start_date):
+    """A party's rows for the period after a brought-forward row, each with its running balance"""
+    balance = brought_forward
+    rows = [(start_date, None, None, None, None, max(balance, 0.0), max(-balance, 0.0), balance,
+             "Balance brought forward")]
+    for day, item, quantity, unit, rate, debit, credit, description in records:
+        balance += debit - credit
+        rows.append((day, item, quantity, unit, rate, debit, credit, balance, description))
+    return rows
+
+def format_cell(value, decimals=2):
+    """Cell text: amounts with thousands separators, blanks for missing values"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:,.{decimals}f}"
+    return str(value)
+
+def statement_text(party, rows, start_date, end_date):
+    """Lines of a statement laid out as fixed-width text"""
+    address = [line for line in str(party.get("address") or "").splitlines() if line.strip()]
+    total_debit = sum(row[5] for row in rows)
+    total_credit = sum(row[6] for row in rows)
+    return [
+        "STATEMENT OF ACCOUNT",
+        "",
+        str(party["name"]),
+        *address,
+        f"Period: {start_date} to {end_date}",
+        "",
+        TEXT_LAYOUT.format(*HEADINGS),
+        *(TEXT_LAYOUT.format(*(format_cell(value) for value in row)) for row in rows),
+        "",
+        f"Total debit: Rs. {total_debit:,.2f}   Total credit: Rs. {total_credit:,.2f}   "
+        f"Closing balance: Rs. {rows[-1][7]:,.2f}"
+    ]
+
+def statement_html(party, rows, start_date, end_date):
+    """A statement as an HTML page"""
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(format_cell(value))}</td>" for value in row) + "</tr>\n"
+        for row in rows
+    )
+    return (
+        f"<h1>Statement of account</h1>\n<h2>{html.escape(str(party['name']))}</h2>\n"
+        f"<p>Period: {start_date} to {end_date}</p>\n"
+        "<table border=\"1\">\n<thead><tr>" + "".join(f"<th>{heading}</th>" for heading in HEADINGS)
+        + f"</tr></thead>\n<tbody>\n{body}</tbody>\n</table>\n"
+    )
+
+def pdf_escape(line):
+    """Text line as a PDF string literal body"""
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def pdf_document(lines, lines_per_page=PDF_LINES_PER_PAGE):
+    """Minimal PDF of text lines in a monospaced font, so statements need no PDF library"""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    # Objects 1-3 are the catalog, the page tree and the font; each page adds its content and page objects
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"]
+    kids = []
+    for page_lines in pages:
+        text = "".join(f"({pdf_escape(line)}) Tj T* " for line in page_lines)
+        stream = f"BT /F1 8 Tf 10 TL 36 {PDF_PAGE_HEIGHT - 40} Td {text}ET".encode("latin-1", "replace")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PDF_PAGE_WIDTH} {PDF_PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        ).encode())
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    document = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(document))
+        document += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(document)
+    document += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    document += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    document += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(document)
+
+def render_statement(task):
+    """Write one party's statement files; runs in a worker process"""
+    party, records, brought_forward, start_date, end_date, output_dir, formats = task
+    rows = statement_rows(records, brought_forward, start_date)
+    stem = os.path.join(output_dir, file_stem(party["id"], party["name"]))
+
+    if "csv" in formats:
+        with open(f"{stem}.csv", "w", newline="", encoding="utf-8") as target:
+            writer = csv.writer(target)
+            writer.writerow(HEADINGS)
+            writer.writerows(rows)
+    if "html" in formats:
+        with open(f"{stem}.html", "w", encoding="utf-8") as target:
+            target.write(statement_html(party, rows, start_date, end_date))
+    if "pdf" in formats:
+        with open(f"{stem}.pdf", "wb") as target:
+            target.write(pdf_document(statement_text(party, rows, start_date, end_date)))
+    return len(formats)
+
+def generate_statements(start_date, end_date, output_dir, formats=("pdf",), workers=STATEMENT_WORKERS,
+                        include_inactive=False):
+    """Write statements of every party for a period in parallel, returning counts and timings"""
+    started = time.perf_counter()
+    output_dir = os.path.abspath(output_dir)
+    ledger_data, brought_forward = database.get_statement_data(start_date, end_date)
+    parties = database.get_dimension("parties")
+    ranges = partition(ledger_data)
+    query_seconds = time.perf_counter() - started
+
+    # Parties with nothing in the period and nothing owed either way get no statement
+    records = ledger_records(ledger_data)
+    tasks = []
+    for party in parties.to_dict("records"):
+        balance = float(brought_forward.get(party["id"], 0.0))
+        if party["id"] not in ranges and not round(balance, 2) and not include_inactive:
+            continue
+        start, stop = ranges.get(party["id"], (0, 0))
+        tasks.append((party, records[start:stop], balance, start_date, end_date, output_dir, formats))
+
+    os.makedirs(output_dir, exist_ok=True)
+    render_started = time.perf_counter()
+    if workers > 1 and len(tasks) > 1:
+        # Spawned workers do not inherit the app's threads and locks the way forked ones would
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            files = sum(executor.map(render_statement, tasks, chunksize=chunksize))
+    else:
+        files = sum(map(render_statement, tasks))
+    render_seconds = time.perf_counter() - render_started
+
+    return {
+        "statements": len(tasks),
+        "files": files,
+        "rows": len(ledger_data),
+        "query_seconds": query_seconds,
+        "render_seconds": render_seconds,
+        "workers": workers,
+        "statements_per_second": len(tasks) / render_seconds if render_seconds else 0.0
+    }
+
+def main(argv=None):
+    """Write month-end statements of every party"""
+    default_start, default_end = last_month()
+    parser = argparse.ArgumentParser(description="Write statements of account for every party")
+    parser.add_argument("--company", help="company database file (default: the default database)")
+    parser.add_argument("--from", dest="start_date", default=default_start, help="first date (default: start of last month)")
+    parser.add_argument("--to", dest="end_date", default=default_end, help="last date (default: end of last month)")
+    parser.add_argument("-o", "--output-dir", default="statements", help="folder for the statement files")
+    parser.add_argument("--format", default="pdf", help=f"comma separated formats ({', '.join(FORMATS)})")
+    parser.add_argument("--workers", type=int, default=STATEMENT_WORKERS, help="rendering processes")
+    parser.add_argument("--all", action="store_true", help="include parties with no activity and no balance")
+    args = parser.parse_args(argv)
+
+    formats = tuple(f.strip().lower() for f in args.format.split(",") if f.strip())
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        parser.error(f"unknown format {', '.join(unknown)}")
+
+    tenants.set_current_company(args.company)
+    if args.company and not os.path.exists(tenants.company_path(args.company)):
+        print(f"error: company database {args.company} does not exist", file=sys.stderr)
+        return 1
+
+    result = generate_statements(args.start_date, args.end_date, args.output_dir, formats, args.workers, args.all)
+    print(f"{result['statements']} statements ({result['files']} files, {result['rows']} rows) "
+          f"for {args.start_date} to {args.end_date} in {args.output_dir}")
+    print(f"query {result['query_seconds']:.2f} s, rendering {result['render_seconds']:.2f} s "
+          f"on {result['workers']} processes: {result['statements_per_second']:.0f} statements/s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import os
+import sqlite3
+import sys
+import time
+from datetime import date
+import changefeed
+
+# Format used for the transactions table of newly created databases
+DEFAULT_FORMAT = os.environ.get("BUSINESS_STORAGE_FORMAT", "standard")
+
+STANDARD = "standard"
+COMPACT = "compact"
+
+# Compact format scale factors: money in paise, quantities in thousandths
+MONEY_SCALE = 100
+QUANTITY_SCALE = 1000
+
+# Day numbers count days since 1970-01-01
+JULIAN_EPOCH = 2440587.5
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+STANDARD_TRANSACTIONS_TABLE = '''
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_date DATE NOT NULL,
+    party_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    quantity REAL NOT NULL,
+    rate REAL NOT NULL,
+    description TEXT,
+    transaction_type TEXT NOT NULL, -- 'incoming' or 'outgoing'
+    amount REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    voucher_id INTEGER, -- set for lines entered as part of a voucher
+    FOREIGN KEY (party_id) REFERENCES parties (id),
+    FOREIGN KEY (item_id) REFERENCES items (id),
+    FOREIGN KEY (voucher_id) REFERENCES vouchers (id)
+)
+'''
+
+COMPACT_TRANSACTIONS_TABLE = '''
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_date INTEGER NOT NULL, -- days since 1970-01-01
+    month_key INTEGER NOT NULL, -- year * 100 + month
+    party_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL, -- thousandths of a unit
+    rate INTEGER NOT NULL, -- paise
+    description TEXT,
+    transaction_type TEXT NOT NULL, -- 'incoming' or 'outgoing'
+    amount INTEGER NOT NULL, -- paise
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    voucher_id INTEGER, -- set for lines entered as part of a voucher
+    FOREIGN KEY (party_id) REFERENCES parties (id),
+    FOREIGN KEY (item_id) REFERENCES items (id),
+    FOREIGN KEY (voucher_id) REFERENCES vouchers (id)
+)
+'''
+
+SETTINGS_TABLE = '''
+CREATE TABLE IF NOT EXISTS storage_settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+)
+'''
+
+def date_to_day(value):
+    """Convert an ISO date string or date object to a day number"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.toordinal() - EPOCH_ORDINAL
+
+def date_to_month_key(value):
+    """Convert an ISO date string or date object to a year * 100 + month key"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.year * 100 + value.month
+
+# Queries go through these helpers so both formats return the same values
+# (rupees, units and ISO dates) to the pages
+class StorageFormat:
+    """SQL expressions and parameter conversions for a transactions storage format"""
+
+    def __init__(self, name):
+        self.name = name
+        self.compact = name == COMPACT
+
+    def money(self, expression):
+        """Money expression (or aggregate of one) in rupees"""
+        return f"(({expression}) / {MONEY_SCALE}.0)" if self.compact else expression
+
+    def quantity(self, expression):
+        """Quantity expression (or aggregate of one) in units"""
+        return f"(({expression}) / {QUANTITY_SCALE}.0)" if self.compact else expression
+
+    def stored_money(self, expression):
+        """Rupee expression converted to the stored money representation"""
+        return f"CAST(ROUND(({expression}) * {MONEY_SCALE}) AS INTEGER)" if self.compact else expression
+
+    def date(self, column):
+        """Date column as ISO text"""
+        return f"date({column} * 86400, 'unixepoch')" if self.compact else column
+
+    def day(self, column):
+        """Date column as a day number"""
+        return column if self.compact else f"CAST(julianday({column}) - {JULIAN_EPOCH} AS INTEGER)"
+
+    def month(self, alias=""):
+        """Transaction month as 'YYYY-MM' text"""
+        if self.compact:
+            return f"printf('%04d-%02d', {alias}month_key / 100, {alias}month_key % 100)"
+        return f"strftime('%Y-%m', {alias}transaction_date)"
+
+    def month_group(self, alias=""):
+        """Expression to group transactions by month"""
+        return f"{alias}month_key" if self.compact else f"strftime('%Y-%m', {alias}transaction_date)"
+
+    def date_value(self, sql_date):
+        """Convert an SQL date expression (e.g. date('now')) to the stored date representation"""
+        return f"CAST(julianday({sql_date}) - {JULIAN_EPOCH} AS INTEGER)" if self.compact else sql_date
+
+    def date_param(self, value):
+        """Convert an ISO date parameter to the stored date representation"""
+        return date_to_day(value) if self.compact else value
+
+    def transaction_row(self, transaction_date, quantity, rate, amount):
+        """Convert a new transaction's date and figures to stored values"""
+        if not self.compact:
+            return {"transaction_date": transaction_date, "quantity": quantity, "rate": rate, "amount": amount}
+        return {
+            "transaction_date": date_to_day(transaction_date),
+            "month_key": date_to_month_key(transaction_date),
+            "quantity": round(quantity * QUANTITY_SCALE),
+            "rate": round(rate * MONEY_SCALE),
+            "amount": round(amount * MONEY_SCALE)
+        }
+
+def get_storage_format(conn):
+    """Return the storage format of the database behind a connection"""
+    try:
+        row = conn.execute("SELECT value FROM storage_settings WHERE key = 'storage_format'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    return StorageFormat(row[0] if row else STANDARD)
+
+def create_transactions_table(conn):
+    """Create the transactions table in the default format for new databases"""
+    conn.execute(SETTINGS_TABLE)
+
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'"
+    ).fetchone()
+    if exists:
+        add_missing_columns(conn)
+        return
+
+    if DEFAULT_FORMAT == COMPACT:
+        conn.execute(COMPACT_TRANSACTIONS_TABLE.format(table="transactions"))
+        conn.execute(
+            "INSERT OR REPLACE INTO storage_settings (key, value) VALUES ('storage_format', ?)",
+            (COMPACT,)
+        )
+    else:
+        conn.execute(STANDARD_TRANSACTIONS_TABLE)
+
+def add_missing_columns(conn):
+    """Add columns introduced after a database's transactions table was created"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(transactions)")}
+    if "voucher_id" not in columns:
+        conn.execute("ALTER TABLE transactions ADD COLUMN voucher_id INTEGER REFERENCES vouchers (id)")
+
+def create_transaction_indexes(conn):
+    """Create the transactions indexes used by the reports"""
+    # Per-party scans in date order (party ledger, aging)
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_transactions_party_date
+    ON transactions (party_id, transaction_date, id)
+    ''')
+
+    # Per-item scans in date order (item ledger)
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_transactions_item_date
+    ON transactions (item_id, transaction_date, id)
+    ''')
+
+    # Lines of a voucher
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_transactions_voucher
+    ON transactions (voucher_id) WHERE voucher_id IS NOT NULL
+    ''')
+
+def migrate_to_compact(conn):
+    """Rewrite a standard-format transactions table into the compact format"""
+    if get_storage_format(conn).compact:
+        return False
+
+    conn.execute(SETTINGS_TABLE)
+    add_missing_columns(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Indexes added by migrations go with the old table, so keep their definitions
+        indexes = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'transactions' AND sql IS NOT NULL"
+        ).fetchall()
+        conn.execute("DROP TABLE IF EXISTS transactions_compact")
+        conn.execute(COMPACT_TRANSACTIONS_TABLE.format(table="transactions_compact"))
+        conn.execute(f'''
+        INSERT INTO transactions_compact
+            (id, transaction_date, month_key, party_id, item_id, quantity, rate,
+             description, transaction_type, amount, created_at, voucher_id)
+        SELECT id,
+               CAST(julianday(transaction_date) - {JULIAN_EPOCH} AS INTEGER),
+               CAST(strftime('%Y%m', transaction_date) AS INTEGER),
+               party_id, item_id,
+               CAST(ROUND(quantity * {QUANTITY_SCALE}) AS INTEGER),
+               CAST(ROUND(rate * {MONEY_SCALE}) AS INTEGER),
+               description, transaction_type,
+               CAST(ROUND(amount * {MONEY_SCALE}) AS INTEGER),
+               created_at, voucher_id
+        FROM transactions
+        ''')
+        conn.execute("DROP TABLE transactions")
+        conn.execute("ALTER TABLE transactions_compact RENAME TO transactions")
+        create_transaction_indexes(conn)
+        for name, sql in indexes:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone():
+                conn.execute(sql)
+
+        # Dropping the old table dropped its change log triggers
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_log'").fetchone():
+            changefeed.create_triggers(conn, "transactions")
+        conn.execute(
+            "INSERT OR REPLACE INTO storage_settings (key, value) VALUES ('storage_format', ?)",
+            (COMPACT,)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # Give the pages freed by the old table back to the file system
+    conn.execute("VACUUM")
+    return True
+
+def main():
+    """Migrate a database file to the compact storage format"""
+    if len(sys.argv) != 2:
+        print("usage: python storage.py DATABASE")
+        return 2
+
+    path = sys.argv[1]
+    size_before = os.path.getsize(path)
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    migrated = migrate_to_compact(conn)
+    conn.close()
+
+    if not migrated:
+        print(f"{path} already uses the compact format")
+        return 0
+
+    size_after = os.path.getsize(path)
+    print(f"migrated {path} in {time.perf_counter() - started:.1f} s: "
+          f"{size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
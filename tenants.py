@@ -0,0 +1,327 @@
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# The default database holds the users and the company registry, and is
+# also the data database for users that are not assigned to a company
+DEFAULT_DATABASE = os.environ.get("BUSINESS_DATABASE", "business_management.db")
+COMPANIES_DIR = os.environ.get("BUSINESS_COMPANIES_DIR", "companies")
+
+# Company selected for the current script run (None means the default database)
+_current_company = contextvars.ContextVar("current_company", default=None)
+
+def set_current_company(company_file):
+    """Route database connections in this context to a company's database file"""
+    _current_company.set(company_file)
+
+def get_current_company():
+    """Return the company database file selected for this context, if any"""
+    return _current_company.get()
+
+def company_path(company_file=None):
+    """Resolve a company database file to a path (None is the default database)"""
+    if not company_file:
+        return os.path.abspath(DEFAULT_DATABASE)
+    return os.path.abspath(os.path.join(COMPANIES_DIR, company_file))
+
+def current_path():
+    """Path of the database the current context is routed to"""
+    return company_path(get_current_company())
+
+def archive_path(db_path, closing_date):
+    """Archive database file of a company's fiscal year closing on a date"""
+    stem = os.path.splitext(db_path)[0]
+    return f"{stem}_archive_{closing_date}.db"
+
+def company_file_name(name, taken=()):
+    """Derive a database file name from a company name, suffixing it if already taken"""
+    slug = re.sub(r"[^a-z0-9]+", "_", name.strip().lower()).strip("_") or "company"
+    file_name = f"{slug}.db"
+    suffix = 2
+    # Distinct names can share a slug ("A&B" and "A-B"), so never reuse a file
+    while file_name in taken or os.path.exists(company_path(file_name)):
+        file_name = f"{slug}_{suffix}.db"
+        suffix += 1
+    return file_name
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() returns it to its tenant pool"""
+
+    pool = None
+    idle = False
+
+    def close(self):
+        if self.pool is None or not self.pool.release(self):
+            super().close()
+
+    def discard(self):
+        """Close the underlying connection instead of returning it to the pool"""
+        super().close()
+
+class TenantPool:
+    """Bounded set of idle connections to one tenant database"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.lock = threading.Lock()
+        self.idle_connections = []
+        self.last_used = time.monotonic()
+        self.closed = False
+
+    def acquire(self):
+        """Hand out an idle connection, opening a new one if none is free"""
+        with self.lock:
+            self.last_used = time.monotonic()
+            if self.idle_connections:
+                conn = self.idle_connections.pop()
+                conn.idle = False
+                return conn
+
+        conn = sqlite3.connect(self.path, factory=PooledConnection, check_same_thread=False)
+        conn.pool = self
+        return conn
+
+    def release(self, conn):
+        """Take a connection back; returns False if the caller should close it"""
+        if conn.idle:
+            return True
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            return False
+
+        with self.lock:
+            self.last_used = time.monotonic()
+            if self.closed or len(self.idle_connections) >= self.size:
+                return False
+            conn.idle = True
+            self.idle_connections.append(conn)
+            return True
+
+    def close(self):
+        """Close idle connections; borrowed ones are closed when released"""
+        with self.lock:
+            self.closed = True
+            connections, self.idle_connections = self.idle_connections, []
+        for conn in connections:
+            conn.discard()
+
+class TenantRouter:
+    """Routes connections to per-company database files with bounded pooling"""
+
+    def __init__(self, max_tenants=16, pool_size=4, idle_timeout=900):
+        self.max_tenants = max_tenants
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.pools = {}
+        self.initialized = set()
+        self.init_locks = {}
+        self.initializer = None
+        self.evict_callbacks = []
+        self.last_sweep = time.monotonic()
+
+    def connect(self, company_file=None):
+        """Return a pooled connection to a company's database"""
+        path = company_path(company_file)
+        pool = self._get_pool(path)
+
+        if self.initializer and path not in self.initialized:
+            self._initialize(pool, company_file)
+
+        return pool.acquire()
+
+    def _initialize(self, pool, company_file):
+        """Run the initializer once per database; concurrent callers wait for it to finish"""
+        with self.lock:
+            init_lock = self.init_locks.setdefault(pool.path, threading.Lock())
+
+        with init_lock:
+            if pool.path in self.initialized:
+                return
+            conn = pool.acquire()
+            try:
+                self.initializer(conn, company_file)
+            finally:
+                conn.close()
+            self.initialized.add(pool.path)
+
+    def _get_pool(self, path):
+        """Find or create the pool for a path, evicting idle tenants as needed"""
+        with self.lock:
+            pool = self.pools.get(path)
+            if pool is not None:
+                self.pools[path] = self.pools.pop(path)  # mark most recently used
+                evicted = self._sweep(time.monotonic())
+            else:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                pool = TenantPool(path, self.pool_size)
+                self.pools[path] = pool
+                evicted = self._sweep(time.monotonic(), force=True)
+
+        for evicted_path in evicted:
+            for callback in self.evict_callbacks:
+                callback(evicted_path)
+
+        return pool
+
+    def _sweep(self, now, force=False):
+        """Close tenants idle past the timeout and the least recently used beyond the limit"""
+        if not force and now - self.last_sweep < 60:
+            return []
+        self.last_sweep = now
+
+        evicted = []
+        for path, pool in list(self.pools.items()):
+            over_limit = len(self.pools) > self.max_tenants
+            if over_limit or now - pool.last_used > self.idle_timeout:
+                pool.close()
+                del self.pools[path]
+                evicted.append(path)
+        return evicted
+
+    def open_paths(self):
+        """Paths of the databases that currently have a pool"""
+        with self.lock:
+            return list(self.pools)
+
+    def evict_idle(self):
+        """Run an eviction sweep immediately"""
+        with self.lock:
+            evicted = self._sweep(time.monotonic(), force=True)
+        for path in evicted:
+            for callback in self.evict_callbacks:
+                callback(path)
+        return evicted
+
+    def close_all(self):
+        """Close every pool, e.g. at process shutdown"""
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            pool.close()
+
+router = TenantRouter()
+
+def get_registry_connection():
+    """Connection to the default database, which holds the company registry"""
+    return router.connect(None)
+
+def initialize_registry(conn):
+    """Create the company registry tables in the default database"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS companies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        db_file TEXT UNIQUE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_companies (
+        username TEXT NOT NULL,
+        company_id INTEGER NOT NULL,
+        PRIMARY KEY (username, company_id),
+        FOREIGN KEY (company_id) REFERENCES companies (id)
+    )
+    ''')
+    conn.commit()
+
+def get_user_companies(username):
+    """Companies a user can open as (name, db_file) pairs; admin sees all"""
+    conn = get_registry_connection()
+    if username == "admin":
+        rows = conn.execute("SELECT name, db_file FROM companies ORDER BY name").fetchall()
+    else:
+        rows = conn.execute("""
+        SELECT c.name, c.db_file
+        FROM companies c
+        JOIN user_companies uc ON uc.company_id = c.id
+        WHERE uc.username = ?
+        ORDER BY c.name
+        """, (username,)).fetchall()
+    conn.close()
+    return rows
+
+def add_company(name, username):
+    """Register a new company with its own database file and assign it to a user"""
+    conn = get_registry_connection()
+    cursor = conn.cursor()
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if cursor.execute("SELECT 1 FROM companies WHERE name = ?", (name,)).fetchone():
+            conn.rollback()
+            return False, "Company name already exists"
+
+        taken = {row[0] for row in cursor.execute("SELECT db_file FROM companies")}
+        db_file = company_file_name(name, taken)
+        cursor.execute("INSERT INTO companies (name, db_file) VALUES (?, ?)", (name, db_file))
+        cursor.execute(
+            "INSERT INTO user_companies (username, company_id) VALUES (?, ?)",
+            (username, cursor.lastrowid)
+        )
+        conn.commit()
+        success = True
+        message = "Company added successfully"
+    except sqlite3.Error as e:
+        conn.rollback()
+        success = False
+        message = f"Error adding company: {e}"
+    finally:
+        conn.close()
+
+    return success, message
+
+def get_companies():
+    """All registered companies as (id, name) pairs"""
+    conn = get_registry_connection()
+    rows = conn.execute("SELECT id, name FROM companies ORDER BY name").fetchall()
+    conn.close()
+    return rows
+
+def get_assignable_users():
+    """Usernames that can be given access to companies (admin already sees all)"""
+    conn = get_registry_connection()
+    rows = conn.execute("SELECT username FROM users WHERE username != 'admin' ORDER BY username").fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+def get_company_ids(username):
+    """Ids of the companies a user is assigned to"""
+    conn = get_registry_connection()
+    rows = conn.execute("SELECT company_id FROM user_companies WHERE username = ?", (username,)).fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+def set_user_companies(username, company_ids):
+    """Replace the set of companies a user can open"""
+    conn = get_registry_connection()
+    cursor = conn.cursor()
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM user_companies WHERE username = ?", (username,))
+        cursor.executemany(
+            "INSERT INTO user_companies (username, company_id) VALUES (?, ?)",
+            [(username, company_id) for company_id in company_ids]
+        )
+        conn.commit()
+        success = True
+        message = f"Company access updated for {username}"
+    except sqlite3.Error as e:
+        conn.rollback()
+        success = False
+        message = f"Error updating company access: {e}"
+    finally:
+        conn.close()
+
+    return success, message
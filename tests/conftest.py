@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backup
+import database
+import metrics
+import migrations
+import tenants
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+@pytest.fixture
+def company_db(tmp_path, monkeypatch):
+    """Route the default database to a fresh file in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tenants, "DEFAULT_DATABASE", str(tmp_path / "business_management.db"))
+    monkeypatch.setattr(migrations, "BACKFILL_IN_BACKGROUND", False)
+    tenants.set_current_company(None)
+    yield tenants.company_path()
+    tenants.router.close_all()
+
+@pytest.fixture
+def app(company_db, monkeypatch):
+    """Run the app as a logged-in user, without the process-wide background services"""
+    monkeypatch.setattr(backup.scheduler, "start", lambda: None)
+    monkeypatch.setattr(metrics.server, "start", lambda: None)
+
+    def run(username, page=None):
+        at = AppTest.from_file(APP, default_timeout=60)
+        at.session_state.logged_in = True
+        at.session_state.username = username
+        if page:
+            at.session_state.current_page = page
+        return at.run()
+
+    return run
+
+def add_party(name):
+    """Add a party and return its id"""
+    database.add_party(name, "", "", "", "")
+    conn = database.get_connection()
+    party_id = conn.execute("SELECT id FROM parties WHERE name = ?", (name,)).fetchone()[0]
+    conn.close()
+    return party_id
+
+def add_item(name):
+    """Add an item and return its id"""
+    database.add_item(name, "", "pcs")
+    conn = database.get_connection()
+    item_id = conn.execute("SELECT id FROM items WHERE name = ?", (name,)).fetchone()[0]
+    conn.close()
+    return item_id
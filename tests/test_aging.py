@@ -0,0 +1,66 @@
+import pytest
+
+import database
+from conftest import add_item, add_party
+
+def aging_row(party_name, as_of_date):
+    aging = database.get_receivables_aging(as_of_date)
+    return aging.set_index("party_name").loc[party_name]
+
+def test_open_amounts_fall_into_buckets_by_age(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    database.add_transaction("2025-01-01", party_id, item_id, 1, 100, "", "outgoing")  # 90+ days
+    database.add_transaction("2025-03-15", party_id, item_id, 1, 200, "", "outgoing")  # 61-90 days
+    database.add_transaction("2025-04-15", party_id, item_id, 1, 300, "", "outgoing")  # 31-60 days
+    database.add_transaction("2025-05-20", party_id, item_id, 1, 400, "", "outgoing")  # 0-30 days
+
+    row = aging_row("Acme", "2025-06-01")
+
+    assert row["0-30 Days"] == pytest.approx(400)
+    assert row["31-60 Days"] == pytest.approx(300)
+    assert row["61-90 Days"] == pytest.approx(200)
+    assert row["90+ Days"] == pytest.approx(100)
+    assert row["total"] == pytest.approx(1000)
+
+def test_bucket_edges_are_inclusive(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    database.add_transaction("2025-05-02", party_id, item_id, 1, 10, "", "outgoing")  # 30 days
+    database.add_transaction("2025-05-01", party_id, item_id, 1, 20, "", "outgoing")  # 31 days
+    database.add_transaction("2025-03-03", party_id, item_id, 1, 40, "", "outgoing")  # 90 days
+    database.add_transaction("2025-03-02", party_id, item_id, 1, 80, "", "outgoing")  # 91 days
+
+    row = aging_row("Acme", "2025-06-01")
+
+    assert row["0-30 Days"] == pytest.approx(10)
+    assert row["31-60 Days"] == pytest.approx(20)
+    assert row["61-90 Days"] == pytest.approx(40)
+    assert row["90+ Days"] == pytest.approx(80)
+
+def test_payments_settle_oldest_amounts_first(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    database.add_transaction("2025-01-01", party_id, item_id, 1, 100, "", "outgoing")
+    database.add_transaction("2025-05-20", party_id, item_id, 1, 400, "", "outgoing")
+    database.add_transaction("2025-05-25", party_id, item_id, 1, 150, "", "incoming")
+
+    row = aging_row("Acme", "2025-06-01")
+
+    assert row["90+ Days"] == pytest.approx(0)
+    assert row["0-30 Days"] == pytest.approx(350)
+    assert row["total"] == pytest.approx(350)
+
+def test_settled_parties_and_later_rows_are_left_out(company_db):
+    paid_id = add_party("Paid")
+    open_id = add_party("Open")
+    item_id = add_item("Bolt")
+    database.add_transaction("2025-05-01", paid_id, item_id, 1, 100, "", "outgoing")
+    database.add_transaction("2025-05-10", paid_id, item_id, 1, 100, "", "incoming")
+    database.add_transaction("2025-05-01", open_id, item_id, 1, 50, "", "outgoing")
+    database.add_transaction("2025-07-01", open_id, item_id, 1, 500, "", "outgoing")
+
+    aging = database.get_receivables_aging("2025-06-01")
+
+    assert aging["party_name"].tolist() == ["Open"]
+    assert aging["total"].iloc[0] == pytest.approx(50)
@@ -0,0 +1,42 @@
+import tenants
+
+def register_user(username):
+    conn = tenants.get_registry_connection()
+    conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, "x"))
+    conn.commit()
+    conn.close()
+
+def test_unassigned_user_is_stopped_once_companies_exist(app):
+    register_user("bob")
+    tenants.add_company("Acme", "admin")
+
+    at = app("bob")
+
+    assert not at.exception
+    assert [warning.value for warning in at.warning] == [
+        "No company has been assigned to you yet. Ask an administrator for access."
+    ]
+    assert at.session_state.company is None
+    assert not [button for button in at.sidebar.button if button.label.endswith("Dashboard")]
+
+def test_assigned_user_is_routed_to_their_company(app):
+    register_user("bob")
+    tenants.add_company("Acme", "admin")
+    tenants.add_company("Beta", "admin")
+    company_ids = dict((name, company_id) for company_id, name in tenants.get_companies())
+    tenants.set_user_companies("bob", [company_ids["Beta"]])
+
+    at = app("bob")
+
+    assert not at.exception
+    assert at.session_state.company == "beta.db"
+    assert at.sidebar.selectbox[0].options == ["Beta"]
+
+def test_users_share_the_default_database_until_companies_exist(app):
+    register_user("bob")
+
+    at = app("bob")
+
+    assert not at.exception
+    assert not at.warning
+    assert at.session_state.company is None
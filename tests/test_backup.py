@@ -0,0 +1,76 @@
+import threading
+from datetime import datetime, timedelta
+
+import backup
+
+def daily_backups(days, start=datetime(2025, 6, 30, 2, 0)):
+    """One backup per day going back from start, newest first like list_backups"""
+    return [(start - timedelta(days=day), f"backup-{day}") for day in range(days)]
+
+def test_nothing_expires_within_keep_last():
+    backups = daily_backups(5)
+
+    assert backup.expired_backups(backups, keep_last=7, keep_weekly=0) == []
+
+def test_keep_last_keeps_the_newest():
+    backups = daily_backups(10)
+
+    expired = backup.expired_backups(backups, keep_last=3, keep_weekly=0)
+
+    assert expired == [path for _, path in backups[3:]]
+
+def test_weekly_keeps_the_newest_backup_of_each_week():
+    backups = daily_backups(28)  # 2025-06-30 is a Monday, so the days span five ISO weeks
+
+    expired = backup.expired_backups(backups, keep_last=0, keep_weekly=3)
+
+    kept = [taken_at for taken_at, path in backups if path not in expired]
+    assert [taken_at.date().isoformat() for taken_at in kept] == ["2025-06-30", "2025-06-29", "2025-06-22"]
+
+def test_keep_last_and_weekly_combine():
+    backups = daily_backups(28)
+
+    expired = backup.expired_backups(backups, keep_last=2, keep_weekly=4)
+
+    kept = [path for _, path in backups if path not in expired]
+    # The two newest, plus the newest of each of the four newest weeks
+    assert kept == ["backup-0", "backup-1", "backup-8", "backup-15"]
+
+def test_expired_keeps_newest_first_order():
+    backups = daily_backups(20)
+
+    expired = backup.expired_backups(backups, keep_last=1, keep_weekly=1)
+
+    assert expired == [path for _, path in backups if path in expired]
+    assert "backup-19" in expired
+
+def test_retry_delay_doubles_up_to_the_interval():
+    scheduler = backup.BackupScheduler(interval=3600, retry=300)
+
+    assert [scheduler.retry_delay(failures) for failures in range(1, 6)] == [300, 600, 1200, 2400, 3600]
+
+def test_concurrent_starts_run_one_scheduler_thread(monkeypatch):
+    scheduler = backup.BackupScheduler(interval=3600)
+    started = []
+    release = threading.Event()
+
+    def run():
+        started.append(threading.current_thread())
+        release.wait(5)
+
+    monkeypatch.setattr(scheduler, "_run", run)
+    barrier = threading.Barrier(8)
+
+    def start():
+        barrier.wait()
+        scheduler.start()
+
+    callers = [threading.Thread(target=start) for _ in range(8)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    release.set()
+    scheduler._thread.join()
+
+    assert len(started) == 1
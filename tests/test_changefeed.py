@@ -0,0 +1,79 @@
+import changefeed
+import database
+from conftest import add_item, add_party
+
+def log_size():
+    conn = database.get_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0]
+    finally:
+        conn.close()
+
+def add_transactions(party_id, item_id, count):
+    for _ in range(count):
+        database.add_transaction("2025-01-01", party_id, item_id, 1, 1, "", "incoming")
+
+def test_log_stays_empty_without_subscribers(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+
+    add_transactions(party_id, item_id, 50)
+    database.update_item(item_id, "Bolt", "M8", "pcs")
+
+    assert log_size() == 0
+
+def test_subscribers_see_changes_and_trim_what_all_have_read(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    conn = database.get_connection()
+    try:
+        changefeed.subscribe(conn, "fast")
+        changefeed.subscribe(conn, "slow")
+        add_transactions(party_id, item_id, 5)
+
+        batches = list(changefeed.iter_changes(conn, "fast"))
+        changes = [row for batch in batches for row in batch.itertuples()]
+        assert sum(change.table_name == "transactions" for change in changes) == 5
+        # The slow subscriber still holds the changes back
+        assert log_size() > 0
+
+        list(changefeed.iter_changes(conn, "slow"))
+        assert log_size() == 0
+    finally:
+        conn.close()
+
+def test_unsubscribing_the_last_subscriber_empties_the_log(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    conn = database.get_connection()
+    try:
+        changefeed.subscribe(conn, "reader")
+        add_transactions(party_id, item_id, 5)
+        assert log_size() > 0
+
+        changefeed.unsubscribe(conn, "reader")
+        add_transactions(party_id, item_id, 5)
+    finally:
+        conn.close()
+
+    assert log_size() == 0
+
+def test_sequence_numbers_keep_increasing_across_quiet_periods(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    conn = database.get_connection()
+    try:
+        changefeed.subscribe(conn, "reader")
+        add_transactions(party_id, item_id, 3)
+        first = changefeed.latest_seq(conn)
+        changefeed.unsubscribe(conn, "reader")
+        add_transactions(party_id, item_id, 3)
+
+        seq = changefeed.subscribe(conn, "reader")
+        add_transactions(party_id, item_id, 1)
+        changes = changefeed.read_changes(conn, seq)
+    finally:
+        conn.close()
+
+    assert seq == first
+    assert changes["seq"].tolist() == [first + 1, first + 2]  # the transaction and its stock update
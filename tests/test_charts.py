@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+import charts
+
+@pytest.fixture
+def parties():
+    return pd.DataFrame({
+        "party_name": [f"Party {index}" for index in range(10)],
+        "balance": [5.0, 50.0, 1.0, 40.0, 30.0, 2.0, 20.0, 3.0, 10.0, 4.0],
+        "count": [1] * 10,
+        "rank": list(range(10)),
+    })
+
+def test_top_n_leaves_small_frames_alone(parties):
+    assert charts.top_n(parties, "party_name", "balance", limit=10) is parties
+
+def test_top_n_keeps_the_largest_and_sums_the_rest(parties):
+    reduced = charts.top_n(parties, "party_name", "balance", limit=4, sum_columns=["count"])
+
+    assert reduced["party_name"].tolist() == ["Party 1", "Party 3", "Party 4", "Other (7)"]
+    assert reduced["balance"].tolist() == [50.0, 40.0, 30.0, 45.0]
+    assert reduced["count"].tolist() == [1, 1, 1, 7]
+    assert reduced["balance"].sum() == parties["balance"].sum()
+
+def test_top_n_does_not_sum_other_columns(parties):
+    reduced = charts.top_n(parties, "party_name", "balance", limit=4)
+
+    assert reduced["rank"].iloc[:3].tolist() == [1, 3, 4]
+    assert pd.isna(reduced["rank"].iloc[-1])
+
+@pytest.fixture
+def series():
+    return pd.DataFrame({
+        "date": pd.date_range("2025-01-01", periods=10, freq="D"),
+        "level": [float(day) for day in range(10)],
+        "flow": [1.0] * 10,
+    })
+
+def test_downsample_leaves_short_series_alone(series):
+    assert charts.downsample(series, "date", limit=10) is series
+
+def test_downsample_last_keeps_period_end_levels(series):
+    reduced = charts.downsample(series[["date", "level"]], "date", limit=3)
+
+    assert len(reduced) == 3
+    assert reduced["date"].iloc[-1] == series["date"].iloc[-1]
+    # Each bin is labelled by, and holds the value of, its last row
+    assert reduced["level"].tolist() == [3.0, 6.0, 9.0]
+    assert reduced["date"].dt.day.tolist() == [4, 7, 10]
+
+def test_downsample_sum_keeps_flow_totals(series):
+    reduced = charts.downsample(series[["date", "flow"]], "date", limit=4, how="sum")
+
+    assert len(reduced) == 4
+    assert reduced["flow"].sum() == series["flow"].sum()
+    assert reduced["date"].is_monotonic_increasing
+
+def test_limits_shrink_until_the_payload_fits(series, parties):
+    long_series = pd.concat([series] * 100, ignore_index=True)
+    long_series["date"] = pd.date_range("2020-01-01", periods=len(long_series), freq="D")
+
+    points = charts.limit_points(long_series, "date", limit=500, max_bytes=2000)
+    categories = charts.limit_categories(parties, "party_name", "balance", limit=10, max_bytes=200)
+
+    assert charts.payload_size(points) <= 2000
+    assert len(points) < 500
+    assert charts.payload_size(categories) <= 200 or len(categories) == 2
+    assert categories["balance"].sum() == parties["balance"].sum()
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+import columnar_store
+import database
+import storage
+from conftest import add_item, add_party
+
+def test_ids_keep_integer_precision(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    database.add_transaction("2025-01-01", party_id, item_id, 1, 10, "", "incoming")
+    conn = database.get_connection()
+    big_id = 2 ** 53 + 1  # not representable as a float64
+    conn.execute(
+        """INSERT INTO transactions (id, transaction_date, party_id, item_id, quantity, rate, amount, transaction_type)
+        VALUES (?, '2025-01-02', ?, ?, 2, 5, 10, 'outgoing')""",
+        (big_id, party_id, item_id)
+    )
+    conn.commit()
+
+    store = database.get_transaction_store(conn)
+    conn.close()
+
+    assert store.column("id").tolist()[-1] == big_id
+    assert store.last_id == big_id
+    assert store.column("party_id").dtype == columnar_store.COLUMNS["party_id"]
+
+def test_aggregates_match_the_sql_path(company_db):
+    party_ids = [add_party(name) for name in ("Acme", "Beta", "Core")]
+    item_ids = [add_item(name) for name in ("Bolt", "Nut")]
+    for index in range(30):
+        database.add_transaction(
+            f"2025-0{index % 6 + 1}-1{index % 9}", party_ids[index % 3], item_ids[index % 2],
+            index + 1, 2.5, "", "incoming" if index % 4 else "outgoing"
+        )
+    conn = database.get_connection()
+    try:
+        sql_receivables, sql_payables = database.get_sql_party_balances(conn, "2025-04-15")
+        store_receivables, store_payables = database.get_store_party_balances(conn, "2025-04-15")
+    finally:
+        conn.close()
+
+    for sql, store in ((sql_receivables, store_receivables), (sql_payables, store_payables)):
+        expected = sql.set_index("party_name")["balance"].sort_index()
+        actual = store.set_index("party_name")["balance"].sort_index()
+        assert actual.to_dict() == pytest.approx(expected.to_dict())
+
+def test_reads_wait_for_a_refresh_in_progress(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    database.add_transaction("2025-01-01", party_id, item_id, 1, 10, "", "incoming")
+    conn = database.get_connection()
+    store = database.get_transaction_store(conn)
+    conn.close()
+    finished = threading.Event()
+
+    def read():
+        store.party_balances(storage.date_to_day("2025-12-31"), columnar_store.INCOMING, {party_id: "Acme"})
+        finished.set()
+
+    with store.lock:
+        reader = threading.Thread(target=read)
+        reader.start()
+        assert not finished.wait(0.1)
+    reader.join()
+
+    assert finished.is_set()
@@ -0,0 +1,92 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import cube
+import database
+import tenants
+from conftest import add_item, add_party
+
+ROWS = [
+    # (date, party, item, quantity, rate, type)
+    ("2025-01-05", "Acme", "Bolt", 10, 2, "incoming"),
+    ("2025-01-20", "Acme", "Bolt", 5, 3, "outgoing"),
+    ("2025-01-21", "Acme", "Nut", 4, 1, "outgoing"),
+    ("2025-02-02", "Beta", "Bolt", 2, 5, "outgoing"),
+    ("2025-02-15", "Beta", "Nut", 8, 1, "incoming"),
+    ("2025-03-01", "Acme", "Nut", 1, 7, "outgoing"),
+]
+
+@pytest.fixture
+def ids(company_db):
+    ids = {name: add_party(name) for name in ("Acme", "Beta")}
+    ids.update({name: add_item(name) for name in ("Bolt", "Nut")})
+    return ids
+
+def add_rows(ids, rows):
+    for transaction_date, party, item, quantity, rate, transaction_type in rows:
+        database.add_transaction(transaction_date, ids[party], ids[item], quantity, rate, "", transaction_type)
+
+def expected(rows, ids, dimensions):
+    """Measures grouped straight from the rows"""
+    frame = pd.DataFrame(rows, columns=["date", "party", "item", "quantity", "rate", "transaction_type"])
+    frame["party_id"] = frame["party"].map(ids)
+    frame["item_id"] = frame["item"].map(ids)
+    frame["month"] = frame["date"].str[:7]
+    frame["amount"] = frame["quantity"] * frame["rate"]
+    frame["count"] = 1
+    return frame.groupby(list(dimensions))[["count", "quantity", "amount"]].sum().reset_index()
+
+def assert_slice(transaction_cube, rows, ids, dimensions):
+    actual = transaction_cube.slice(dimensions)
+    frame = expected(rows, ids, dimensions)
+    actual = actual.astype({d: object for d in dimensions}).sort_values(list(dimensions)).reset_index(drop=True)
+    frame = frame.astype({d: object for d in dimensions}).sort_values(list(dimensions)).reset_index(drop=True)
+    pd.testing.assert_frame_equal(actual[frame.columns], frame, check_dtype=False)
+
+@pytest.mark.parametrize("dimensions", [
+    ("party_id",), ("item_id",), ("month",), ("transaction_type",),
+    ("party_id", "month"), ("item_id", "transaction_type"), cube.DIMENSIONS,
+])
+def test_rollups_match_grouping_the_transactions(ids, dimensions):
+    add_rows(ids, ROWS)
+
+    assert_slice(database.get_cube(), ROWS, ids, dimensions)
+
+def test_grand_total(ids):
+    add_rows(ids, ROWS)
+
+    total = database.get_cube().slice(())
+
+    assert total["count"].iloc[0] == len(ROWS)
+    assert total["amount"].iloc[0] == pytest.approx(sum(row[3] * row[4] for row in ROWS))
+
+def test_filters_limit_the_cells(ids):
+    add_rows(ids, ROWS)
+
+    sliced = database.get_cube().slice(("month",), {"party_id": [ids["Acme"]], "transaction_type": ["outgoing"]})
+
+    assert sliced.astype({"month": object}).set_index("month")["amount"].to_dict() == {"2025-01": 19, "2025-03": 7}
+
+def test_new_rows_update_every_rolled_up_cuboid(ids):
+    add_rows(ids, ROWS[:3])
+    transaction_cube = database.get_cube()
+    for dimensions in (("party_id",), ("month", "transaction_type")):
+        transaction_cube.slice(dimensions)
+
+    add_rows(ids, ROWS[3:])
+    transaction_cube = database.get_cube()
+
+    for dimensions in (("party_id",), ("month", "transaction_type"), ("item_id",)):
+        assert_slice(transaction_cube, ROWS, ids, dimensions)
+    # The stored cells match the in-memory ones
+    conn = sqlite3.connect(tenants.company_path())
+    cells = conn.execute("SELECT SUM(count), SUM(amount) FROM cube_cells").fetchone()
+    conn.close()
+    assert cells == (len(ROWS), pytest.approx(sum(row[3] * row[4] for row in ROWS)))
+
+def test_members_lists_distinct_values(ids):
+    add_rows(ids, ROWS)
+
+    assert database.get_cube().members("month") == ["2025-01", "2025-02", "2025-03"]
@@ -0,0 +1,88 @@
+import database
+from conftest import add_item
+
+CONFLICT_MESSAGE = "Item was changed by someone else after you opened it"
+
+def widget(elements, label):
+    return [element for element in elements if element.label == label][-1]
+
+def click(at, label):
+    widget(at.button, label).click()
+    at.run()
+    # AppTest keeps what a run drew before calling st.rerun() until the next run
+    return at.run()
+
+def errors(at):
+    return [error.value for error in at.error]
+
+def test_stale_versions_are_reported_as_conflicts(company_db):
+    item_id = add_item("Bolt")
+
+    assert database.update_item(item_id, "Bolt", "", "pcs", 0) == (True, "Item updated successfully")
+    success, message = database.update_item(item_id, "Bolt", "", "kg", 0)
+    assert success is database.CONFLICT and not success
+    assert message == CONFLICT_MESSAGE
+
+    conn = database.get_connection()
+    conn.execute("DELETE FROM inventory WHERE item_id = ?", (item_id,))
+    conn.execute("DELETE FROM items WHERE id = ?", (item_id,))
+    conn.commit()
+    conn.close()
+    assert database.update_item(item_id, "Bolt", "", "kg", 1) == (False, "Item no longer exists")
+
+def test_reruns_keep_the_version_the_form_was_loaded_with(app):
+    item_id = add_item("Bolt")
+    at = app("admin", "Item Management")
+
+    database.update_item(item_id, "Bolt", "changed elsewhere", "pcs")
+    at.run()  # any widget interaction reruns the page
+    widget(at.text_input, "Item Name*").set_value("Bolt M8")
+    widget(at.button, "Update Item").click()
+    at.run()
+
+    assert errors(at) == [CONFLICT_MESSAGE]
+    assert database.get_item_details(item_id)["name"] == "Bolt"
+
+def test_overwrite_saves_the_users_values(app):
+    item_id = add_item("Bolt")
+    at = app("admin", "Item Management")
+    database.update_item(item_id, "Bolt", "changed elsewhere", "pcs")
+    widget(at.text_input, "Item Name*").set_value("Bolt M8")
+    widget(at.button, "Update Item").click()
+    at.run()
+
+    click(at, "Overwrite with my changes")
+
+    assert not errors(at)
+    details = database.get_item_details(item_id)
+    assert (details["name"], details["description"]) == ("Bolt M8", "")
+
+def test_reload_shows_the_current_values(app):
+    item_id = add_item("Bolt")
+    at = app("admin", "Item Management")
+    database.update_item(item_id, "Bolt", "changed elsewhere", "pcs")
+    widget(at.text_input, "Item Name*").set_value("Bolt M8")
+    widget(at.button, "Update Item").click()
+    at.run()
+
+    click(at, "Reload current values")
+
+    assert not errors(at)
+    assert widget(at.text_area, "Description").value == "changed elsewhere"
+    widget(at.text_input, "Item Name*").set_value("Bolt M8")
+    click(at, "Update Item")
+    details = database.get_item_details(item_id)
+    assert (details["name"], details["description"]) == ("Bolt M8", "changed elsewhere")
+
+def test_stock_input_changes_do_not_move_the_baseline(app):
+    item_id = add_item("Bolt")
+    at = app("admin", "Inventory Management")
+
+    database.update_inventory(item_id, 5, "Counted")
+    at.number_input[0].set_value(3.0)
+    at.run()
+    widget(at.button, "Update Stock").click()
+    at.run()
+
+    assert errors(at) == ["Stock of this item was changed by someone else after you opened it"]
+    assert database.get_inventory_status().set_index("item_id").loc[item_id, "quantity"] == 5
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+import forecast
+import storage
+from conftest import add_item, add_party
+
+def test_demand_matrix_adds_repeated_item_days():
+    demand = pd.DataFrame({"item_id": [1, 1, 2, 3], "day": [10, 10, 11, 10], "quantity": [2.0, 3.0, 1.0, 9.0]})
+
+    matrix = forecast.demand_matrix(demand, np.array([1, 2]), 10, 2)
+
+    # Item 3 is not stocked and is left out
+    assert matrix.tolist() == [[5.0, 0.0], [0.0, 1.0]]
+
+def test_demand_matrix_drops_days_outside_the_window():
+    demand = pd.DataFrame({"item_id": [1, 1, 1], "day": [9, 10, 12], "quantity": [4.0, 1.0, 7.0]})
+
+    matrix = forecast.demand_matrix(demand, np.array([1]), 10, 2)
+
+    assert matrix.tolist() == [[1.0, 0.0]]
+
+def test_window_velocities_average_the_trailing_days():
+    matrix = np.array([[1.0] * 80 + [0.0] * 10, [0.0] * 89 + [14.0]])
+
+    velocities = forecast.window_velocities(matrix, (7, 30, 90))
+
+    assert velocities[0] == pytest.approx([0.0, 20 / 30, 80 / 90])
+    assert velocities[1] == pytest.approx([2.0, 14 / 30, 14 / 90])
+
+def test_window_longer_than_the_matrix_uses_every_day():
+    matrix = np.array([[3.0, 3.0]])
+
+    assert forecast.window_velocities(matrix, (7,))[0] == pytest.approx([3.0])
+
+def test_stock_forecast_statuses_and_cover():
+    as_of = "2025-06-30"
+    last_day = storage.date_to_day(as_of)
+    stock = pd.DataFrame({
+        "item_id": [1, 2, 3, 4],
+        "item_name": ["Steady", "Short", "Empty", "Idle"],
+        "unit": ["pcs"] * 4,
+        "quantity": [1000.0, 10.0, 0.0, 50.0],
+    })
+    # Items 1-3 ship two a day for the last 90 days; item 4 never ships
+    days = np.arange(last_day - 89, last_day + 1)
+    demand = pd.DataFrame({
+        "item_id": np.repeat([1, 2, 3], len(days)),
+        "day": np.tile(days, 3),
+        "quantity": 2.0,
+    })
+
+    result = forecast.stock_forecast(stock, demand, as_of, windows=(7, 30, 90), weights=(1, 1, 1), at_risk_days=14)
+    by_item = result.set_index("item_name")
+
+    assert by_item.loc["Steady", "daily_demand"] == pytest.approx(2.0)
+    assert by_item.loc["Steady", "days_of_cover"] == pytest.approx(500)
+    assert by_item.loc["Steady", "status"] == forecast.OK
+    assert pd.isna(by_item.loc["Steady", "stockout_date"])
+    assert by_item.loc["Short", "status"] == forecast.AT_RISK
+    assert by_item.loc["Short", "stockout_date"] == pd.Timestamp("2025-07-05")
+    assert by_item.loc["Empty", "status"] == forecast.OUT_OF_STOCK
+    assert by_item.loc["Idle", "status"] == forecast.NO_DEMAND
+    assert result["item_name"].tolist()[:2] == ["Empty", "Short"]
+
+def test_recent_weeks_weigh_most():
+    as_of = "2025-06-30"
+    last_day = storage.date_to_day(as_of)
+    stock = pd.DataFrame({"item_id": [1], "item_name": ["Bolt"], "unit": ["pcs"], "quantity": [100.0]})
+    demand = pd.DataFrame({"item_id": [1], "day": [last_day], "quantity": [70.0]})
+
+    result = forecast.stock_forecast(stock, demand, as_of, windows=(7, 30, 90), weights=(0.5, 0.3, 0.2))
+
+    assert result["velocity_7d"].iloc[0] == pytest.approx(10.0)
+    assert result["velocity_30d"].iloc[0] == pytest.approx(70 / 30)
+    assert result["daily_demand"].iloc[0] == pytest.approx(0.5 * 10 + 0.3 * 70 / 30 + 0.2 * 70 / 90)
+
+def test_get_stock_forecast_sums_transactions_on_the_same_day(company_db):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    database.add_transaction("2025-06-01", party_id, item_id, 100, 1, "", "incoming")
+    database.add_transaction("2025-06-28", party_id, item_id, 3, 1, "", "outgoing")
+    database.add_transaction("2025-06-28", party_id, item_id, 4, 1, "", "outgoing")
+    database.add_transaction("2025-06-30", party_id, item_id, 7, 1, "", "outgoing")
+    database.add_transaction("2025-05-01", party_id, item_id, 30, 1, "", "outgoing")  # 61 days back
+
+    result = forecast.get_stock_forecast("2025-06-30").set_index("item_name")
+
+    assert result.loc["Bolt", "quantity"] == pytest.approx(56)
+    assert result.loc["Bolt", "velocity_7d"] == pytest.approx(14 / 7)
+    assert result.loc["Bolt", "velocity_30d"] == pytest.approx(14 / 30)
+    assert result.loc["Bolt", "velocity_90d"] == pytest.approx(44 / 90)
+
+def test_get_stock_forecast_without_transactions(company_db):
+    add_item("Bolt")
+
+    result = forecast.get_stock_forecast("2025-06-30")
+
+    assert result["status"].tolist() == [forecast.NO_DEMAND]
+
+def test_cached_forecast_is_reused_until_the_data_changes(company_db, monkeypatch):
+    party_id = add_party("Acme")
+    item_id = add_item("Bolt")
+    database.add_transaction("2025-06-01", party_id, item_id, 100, 1, "", "incoming")
+    computed = []
+    compute = forecast.get_stock_forecast
+    monkeypatch.setattr(forecast, "get_stock_forecast", lambda as_of: computed.append(as_of) or compute(as_of))
+
+    first = forecast.get_cached_stock_forecast("2025-06-30")
+    assert forecast.get_cached_stock_forecast("2025-06-30") is first
+    assert computed == ["2025-06-30"]
+
+    database.add_transaction("2025-06-30", party_id, item_id, 7, 1, "", "outgoing")
+    updated = forecast.get_cached_stock_forecast("2025-06-30")
+    forecast.get_cached_stock_forecast("2025-07-01")
+
+    assert computed == ["2025-06-30", "2025-06-30", "2025-07-01"]
+    assert updated.loc[0, "velocity_7d"] == pytest.approx(1.0)
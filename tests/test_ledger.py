@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+import database
+from conftest import add_item, add_party
+
+DATES = ["2025-01-03", "2025-01-01", "2025-01-02", "2025-01-02", "2025-01-05", "2025-01-02",
+         "2025-01-04", "2025-01-01", "2025-01-05", "2025-01-03", "2025-01-02"]
+
+@pytest.fixture
+def ledger_rows(company_db):
+    party_id = add_party("Acme")
+    other_id = add_party("Other")
+    item_id = add_item("Bolt")
+    for index, transaction_date in enumerate(DATES):
+        transaction_type = "incoming" if index % 3 == 0 else "outgoing"
+        database.add_transaction(transaction_date, party_id, item_id, index + 1, 10, "", transaction_type)
+        database.add_transaction(transaction_date, other_id, item_id, 1, 10, "", "incoming")
+    return party_id, item_id
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4, len(DATES), 100])
+def test_party_chunks_match_the_full_ledger(ledger_rows, chunk_size):
+    party_id, _ = ledger_rows
+    totals = {}
+
+    chunks = list(database.iter_party_ledger(party_id, chunk_size=chunk_size, totals=totals))
+    chunked = pd.concat(chunks, ignore_index=True)
+    full = database.get_party_ledger(party_id)
+
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    assert chunked["id"].tolist() == full["id"].tolist()
+    assert chunked["id"].is_unique
+    assert chunked["balance"].tolist() == pytest.approx(full["balance"].tolist())
+    assert totals["rows"] == len(DATES)
+    assert totals["balance"] == pytest.approx(full["balance"].iloc[-1])
+
+def test_chunks_follow_date_then_id_order(ledger_rows):
+    party_id, _ = ledger_rows
+
+    chunked = pd.concat(database.iter_party_ledger(party_id, chunk_size=2), ignore_index=True)
+
+    keys = list(zip(chunked["transaction_date"], chunked["id"]))
+    assert keys == sorted(keys)
+
+def test_chunks_respect_the_date_range(ledger_rows):
+    party_id, _ = ledger_rows
+
+    chunked = pd.concat(
+        database.iter_party_ledger(party_id, "2025-01-02", "2025-01-04", chunk_size=3), ignore_index=True
+    )
+
+    expected = sum(1 for d in DATES if "2025-01-02" <= d <= "2025-01-04")
+    assert len(chunked) == expected
+    assert pd.to_datetime(chunked["transaction_date"]).between("2025-01-02", "2025-01-04").all()
+
+def test_item_chunks_carry_the_stock_balance(ledger_rows):
+    _, item_id = ledger_rows
+    totals = {}
+
+    chunked = pd.concat(database.iter_item_ledger(item_id, chunk_size=5, totals=totals), ignore_index=True)
+    full = database.get_item_ledger(item_id)
+
+    assert chunked["id"].tolist() == full["id"].tolist()
+    assert chunked["balance"].tolist() == pytest.approx(full["balance"].tolist())
+    assert totals["quantity_in"] - totals["quantity_out"] == pytest.approx(totals["balance"])
+
+def test_empty_ledger_yields_no_chunks(company_db):
+    party_id = add_party("Acme")
+
+    assert list(database.iter_party_ledger(party_id, chunk_size=3)) == []
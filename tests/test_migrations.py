@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+import migrations
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "migrate.db")
+    conn.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY, touched INTEGER NOT NULL DEFAULT 0)")
+    conn.executemany("INSERT INTO transactions (id) VALUES (?)", [(row_id,) for row_id in range(1, 26)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def touch_backfill(monkeypatch):
+    """A backfill counting how often each row is processed, and the batches it was called with"""
+    batches = []
+
+    def touch(conn, first_id, last_id):
+        batches.append((first_id, last_id))
+        return conn.execute(
+            "UPDATE transactions SET touched = touched + 1 WHERE id BETWEEN ? AND ?", (first_id, last_id)
+        ).rowcount
+
+    def queue(conn):
+        migrations.register_backfill(conn, "touch", "transactions")
+
+    monkeypatch.setattr(migrations, "BACKFILLS", {"touch": touch})
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "Queue the touch backfill", queue)])
+    return batches
+
+def touched_counts(conn):
+    return [touched for (touched,) in conn.execute("SELECT touched FROM transactions ORDER BY id")]
+
+def test_migrations_apply_once(conn, touch_backfill):
+    assert migrations.migrate(conn) == [1]
+    assert migrations.migrate(conn) == []
+    assert migrations.applied_versions(conn) == {1}
+    assert migrations.pending_backfills(conn) == ["touch"]
+
+def test_failed_migration_is_rolled_back_and_retried(conn, monkeypatch):
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "Broken", broken)])
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn)
+
+    assert migrations.applied_versions(conn) == set()
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+def test_backfill_resumes_after_the_last_committed_batch(conn, tmp_path, touch_backfill):
+    migrations.migrate(conn)
+    assert migrations.run_backfill_batch(conn, "touch", batch_size=10) is False
+    conn.close()
+
+    # A new process picks up where the interrupted one stopped
+    reopened = sqlite3.connect(tmp_path / "migrate.db")
+    try:
+        assert migrations.run_backfills(reopened, batch_size=10, pause=0) is True
+        assert touch_backfill == [(1, 10), (11, 20), (21, 25)]
+        assert touched_counts(reopened) == [1] * 25
+        assert migrations.pending_backfills(reopened) == []
+        last_id, rows_changed = reopened.execute(
+            "SELECT last_id, rows_changed FROM schema_backfills WHERE name = 'touch'"
+        ).fetchone()
+        assert (last_id, rows_changed) == (25, 25)
+    finally:
+        reopened.close()
+
+def test_failed_batch_keeps_its_position(conn, touch_backfill, monkeypatch):
+    migrations.migrate(conn)
+    migrations.run_backfill_batch(conn, "touch", batch_size=10)
+
+    def broken(conn, first_id, last_id):
+        conn.execute("UPDATE transactions SET touched = touched + 1 WHERE id BETWEEN ? AND ?", (first_id, last_id))
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setitem(migrations.BACKFILLS, "touch", broken)
+    with pytest.raises(sqlite3.OperationalError):
+        migrations.run_backfill_batch(conn, "touch", batch_size=10)
+
+    assert conn.execute("SELECT last_id FROM schema_backfills WHERE name = 'touch'").fetchone()[0] == 10
+    assert touched_counts(conn) == [1] * 10 + [0] * 15
+
+def test_rows_added_after_registration_are_not_backfilled(conn, touch_backfill):
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO transactions (id) VALUES (26)")
+    conn.commit()
+
+    migrations.run_backfills(conn, batch_size=10, pause=0)
+
+    assert touched_counts(conn) == [1] * 25 + [0]
+
+def test_stop_interrupts_between_batches(conn, touch_backfill):
+    migrations.migrate(conn)
+    stop = threading.Event()
+    stop.set()
+
+    assert migrations.run_backfills(conn, batch_size=10, pause=0, stop=stop) is False
+    assert touch_backfill == [(1, 10)]
+    assert migrations.pending_backfills(conn) == ["touch"]
+
+def test_unknown_backfills_are_not_pending(conn, touch_backfill):
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO schema_backfills (name, target_id) VALUES ('retired', 25)")
+    conn.commit()
+
+    assert migrations.pending_backfills(conn) == ["touch"]
+
+def test_opening_a_database_starts_the_runner_only_for_pending_work(company_db, monkeypatch):
+    started = []
+    monkeypatch.setattr(migrations, "BACKFILL_IN_BACKGROUND", True)
+    monkeypatch.setattr(migrations.runner, "start", started.append)
+    conn = database.get_connection()
+    try:
+        database.initialize_tenant(conn, None)
+        assert started == []
+
+        migrations.register_backfill(conn, "touch", "transactions")
+        conn.commit()
+        monkeypatch.setattr(migrations, "BACKFILLS", {"touch": lambda conn, first_id, last_id: 0})
+        database.initialize_tenant(conn, None)
+        assert started == [company_db]
+    finally:
+        conn.close()
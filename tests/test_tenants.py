@@ -0,0 +1,52 @@
+import threading
+import time
+
+import tenants
+
+def test_company_file_name_suffixes_taken_names(company_db):
+    assert tenants.company_file_name("A&B Traders") == "a_b_traders.db"
+    assert tenants.company_file_name("A-B Traders", taken={"a_b_traders.db"}) == "a_b_traders_2.db"
+    assert tenants.company_file_name("A B Traders", taken={"a_b_traders.db", "a_b_traders_2.db"}) == "a_b_traders_3.db"
+
+def test_companies_with_the_same_slug_get_their_own_files(company_db):
+    assert tenants.add_company("A&B", "admin") == (True, "Company added successfully")
+    assert tenants.add_company("A-B", "admin") == (True, "Company added successfully")
+    assert tenants.add_company("A-B", "admin") == (False, "Company name already exists")
+
+    assert tenants.get_user_companies("admin") == [("A&B", "a_b.db"), ("A-B", "a_b_2.db")]
+
+def test_user_company_assignment(company_db):
+    tenants.add_company("Acme", "admin")
+    tenants.add_company("Beta", "admin")
+    company_ids = dict((name, company_id) for company_id, name in tenants.get_companies())
+
+    assert tenants.set_user_companies("bob", [company_ids["Beta"]])[0]
+    assert tenants.get_user_companies("bob") == [("Beta", "beta.db")]
+    assert tenants.set_user_companies("bob", [company_ids["Acme"], company_ids["Beta"]])[0]
+    assert sorted(tenants.get_company_ids("bob")) == sorted(company_ids.values())
+
+def test_concurrent_first_connections_wait_for_the_initializer(company_db, monkeypatch):
+    calls = []
+    initializer = tenants.router.initializer
+
+    def slow_initializer(conn, company_file):
+        calls.append(company_file)
+        time.sleep(0.2)
+        initializer(conn, company_file)
+
+    monkeypatch.setattr(tenants.router, "initializer", slow_initializer)
+    seen = []
+
+    def connect():
+        conn = tenants.router.connect("concurrent.db")
+        seen.append(conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'transactions'").fetchone()[0])
+        conn.close()
+
+    threads = [threading.Thread(target=connect) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["concurrent.db"]
+    assert seen == [1, 1, 1, 1]
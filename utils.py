@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+import contextlib
 import sqlite3
+import database
+import jobs
+import snapshot
 
 def format_currency(value):
     """Format a value as currency"""
@@ -25,6 +29,14 @@ def format_quantity(value, unit=""):
     
     return formatted
 
+def date_column_config(df):
+    """Show datetime columns of a dataframe as plain dates"""
+    return {
+        column: st.column_config.DateColumn(column, format="YYYY-MM-DD")
+        for column in df.columns
+        if pd.api.types.is_datetime64_any_dtype(df[column])
+    }
+
 def get_date_range_options():
     """Return common date range options"""
     today = datetime.now().date()
@@ -46,6 +58,54 @@ def create_or_get_key(key):
         st.session_state[key] = None
     return st.session_state[key]
 
+def loaded_record(key, record_id, record):
+    """Return a record as it was first loaded into an edit form, until it is saved or reloaded"""
+    # Every widget interaction reruns the page and reads the row again; the form
+    # shows, and the save is checked against, the version the user started from
+    loaded = st.session_state.get(key)
+    if loaded is None or loaded[0] != record_id:
+        loaded = (record_id, record)
+        st.session_state[key] = loaded
+    return loaded[1]
+
+def forget_record(key):
+    """Load the current row into an edit form on the next run"""
+    st.session_state.pop(key, None)
+    st.session_state.pop(f"{key}_conflict", None)
+
+def save_edit(key, submitted, save, loaded_version, current_version):
+    """Save an edit checked against the loaded row version, offering reload or overwrite after a conflict
+
+    save(row_version) runs the update and returns (success, message)."""
+    conflict_key = f"{key}_conflict"
+    result = None
+    if submitted:
+        result = save(loaded_version)
+    elif conflict_key in st.session_state:
+        st.error(st.session_state[conflict_key])
+        reload_col, overwrite_col = st.columns(2)
+        if reload_col.button("Reload current values", key=f"{key}_reload"):
+            forget_record(key)
+            st.rerun()
+        if overwrite_col.button("Overwrite with my changes", key=f"{key}_overwrite"):
+            result = save(current_version)
+    
+    if result is None:
+        return
+    
+    success, message = result
+    if success is database.CONFLICT:
+        st.session_state[conflict_key] = message
+        st.rerun()
+    elif success:
+        forget_record(key)
+        st.success(message)
+        # Refresh the page to show updated data
+        st.rerun()
+    else:
+        st.session_state.pop(conflict_key, None)
+        st.error(message)
+
 def handle_exception(func):
     """Decorator to handle exceptions and display appropriate messages"""
     def wrapper(*args, **kwargs):
@@ -56,3 +116,88 @@ def handle_exception(func):
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
     return wrapper
+
+def report_source_selector(key):
+    """Let a report page opt into the reporting snapshot, showing how fresh it is"""
+    use_snapshot = st.toggle(
+        "Use reporting snapshot",
+        key=key,
+        help="Read from a periodically refreshed copy of the database so this report never blocks new entries"
+    )
+    
+    if not use_snapshot:
+        return contextlib.nullcontext()
+    
+    report_snapshot = snapshot.get_snapshot()
+    
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        if st.button("Refresh Snapshot", key=f"{key}_refresh"):
+            with st.spinner("Refreshing snapshot..."):
+                report_snapshot.refresh()
+    with col1:
+        report_snapshot.refresh(force=False)
+        age = report_snapshot.age()
+        taken_at = datetime.fromtimestamp(report_snapshot.refreshed_at).strftime("%Y-%m-%d %H:%M:%S")
+        st.caption(f"Reading from snapshot taken at {taken_at} ({format_age(age)} ago)")
+    
+    return snapshot.use_snapshot()
+
+def format_age(seconds):
+    """Format a duration in seconds as a short human readable age"""
+    if seconds < 60:
+        return f"{int(seconds)}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m"
+    return f"{int(seconds // 3600)}h {int(seconds % 3600 // 60)}m"
+
+def run_report(name, params, key):
+    """Run a report directly, or on the background job runner if the user opts in"""
+    run_in_background = st.toggle(
+        "Run in background",
+        key=key,
+        help="Compute the report on a worker thread; results are shared with other users asking for the same report"
+    )
+    
+    if not run_in_background:
+        return jobs.REPORTS[name](**params)
+    
+    job = submit_job(name, params, key)
+    
+    if job.status == jobs.DONE:
+        if job.cached:
+            st.caption("Loaded from the shared report cache")
+        return job.result
+    
+    if job.status == jobs.FAILED:
+        show_job_failure(job, key, "Report")
+        return None
+    
+    show_job_progress(job.id)
+    return None
+
+def submit_job(name, params, key):
+    """Submit a background job, showing this session its last failure until the user retries"""
+    # Without holding the failure, the rerun after a failed job would resubmit it straight away
+    last = jobs.runner.get(st.session_state.get(f"{key}_job"))
+    if last is not None and last.status == jobs.FAILED and last.name == name and last.params == params:
+        return last
+    
+    job = jobs.runner.submit(name, params)
+    st.session_state[f"{key}_job"] = job.id
+    return job
+
+def show_job_failure(job, key, label):
+    """Show why a job failed, with a button that lets the next run submit it again"""
+    st.error(f"{label} job #{job.id} failed: {job.error}")
+    st.button("Retry", key=f"{key}_retry", on_click=st.session_state.pop, args=(f"{key}_job", None))
+
+@st.fragment(run_every=1)
+def show_job_progress(job_id):
+    """Poll a background job's progress, rerunning the page once it finishes"""
+    job = jobs.runner.get(job_id)
+    
+    if job is None or job.finished:
+        st.rerun()
+    
+    st.progress(job.progress, text=f"Report job #{job.id}: {job.message}")
@@ -0,0 +1,169 @@
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+import changefeed
+import columnar_store
+import database
+import live_dashboard
+import migrations
+import storage
+import tenants
+
+# First month of the fiscal year (April by default)
+FISCAL_YEAR_START_MONTH = int(os.environ.get("FISCAL_YEAR_START_MONTH", "4"))
+
+# Tables copied to the archive as a whole, so it can be read on its own
+REFERENCE_TABLES = ("storage_settings", "parties", "items")
+
+# Tables whose closed-year rows move to the archive, with the date that decides it
+MOVED_TABLES = (
+    ("transactions", None),
+    ("vouchers", "voucher_date"),
+    ("inventory_adjustments", "date(created_at)"),
+    ("opening_balances", "opening_date"),
+    ("opening_receivables", "transaction_date")
+)
+
+def last_fiscal_year_end(today=None):
+    """Last day of the most recent fiscal year that has ended"""
+    today = today or date.today()
+    year = today.year if today.month >= FISCAL_YEAR_START_MONTH else today.year - 1
+    return date(year, FISCAL_YEAR_START_MONTH, 1) - timedelta(days=1)
+
+def create_archive_table(conn, table):
+    """Create a table in the attached archive with the same definition as in the main database"""
+    sql = conn.execute(
+        "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()[0]
+    sql = re.sub(r'^CREATE TABLE\s+(IF NOT EXISTS\s+)?"?\w+"?', f"CREATE TABLE IF NOT EXISTS archive.{table}", sql)
+    conn.execute(sql)
+
+def close_fiscal_year(closing_date, company_file=None):
+    """Move a company's transactions up to a closing date to an archive file, leaving opening balances"""
+    closing_date = date.fromisoformat(str(closing_date)).isoformat()
+    opening_date = (date.fromisoformat(closing_date) + timedelta(days=1)).isoformat()
+    path = tenants.company_path(company_file)
+    if not os.path.exists(path):
+        return False, f"Database {path} does not exist"
+
+    target = tenants.archive_path(path, closing_date)
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        database.initialize_database(conn)
+        migrations.migrate(conn)
+        fmt = storage.get_storage_format(conn)
+
+        previous = database.get_closed_through(conn)
+        if previous and previous >= closing_date:
+            return False, f"The year up to {previous} is already closed"
+
+        conn.execute("ATTACH DATABASE ? AS archive", (target,))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Party balances: closed-year nets on top of the previous opening balances
+            parties = conn.execute(f"""
+            SELECT party_id, SUM(net)
+            FROM (
+                SELECT party_id,
+                       {fmt.money("SUM(CASE WHEN transaction_type = 'incoming' THEN amount ELSE -amount END)")} as net
+                FROM transactions
+                WHERE transaction_date <= ?
+                GROUP BY party_id
+                UNION ALL
+                SELECT party_id, balance FROM opening_balances WHERE party_id IS NOT NULL
+            )
+            GROUP BY party_id
+            """, (fmt.date_param(closing_date),)).fetchall()
+
+            # Item stock and the rate to value it at
+            items = conn.execute(
+                f"SELECT item_id, quantity, rate FROM ({database.item_stock_query(fmt)})",
+                database.item_stock_params(fmt, closing_date)
+            ).fetchall()
+
+            # Outgoing amounts still unpaid at the close keep their dates for aging
+            receivables = conn.execute(f"""
+            WITH {database.open_amounts_query(fmt)}
+            SELECT party_id, {fmt.date("transaction_date")}, {fmt.money("open_amount")}
+            FROM open_outgoing
+            WHERE open_amount > 0
+            """, database.open_amounts_params(fmt, closing_date)).fetchall()
+
+            # Copy the closed year to the archive, then remove it from the hot database
+            moved = 0
+            for table in REFERENCE_TABLES:
+                create_archive_table(conn, table)
+                conn.execute(f"INSERT OR REPLACE INTO archive.{table} SELECT * FROM main.{table}")
+            for table, date_column in MOVED_TABLES:
+                create_archive_table(conn, table)
+                if date_column is None:
+                    condition, params = "transaction_date <= ?", (fmt.date_param(closing_date),)
+                else:
+                    condition, params = f"{date_column} <= ?", (closing_date,)
+                conn.execute(f"INSERT INTO archive.{table} SELECT * FROM main.{table} WHERE {condition}", params)
+                removed = changefeed.bulk_delete(conn, f"main.{table}", condition, params)
+                if table == "transactions":
+                    moved = removed
+
+            conn.executemany(
+                "INSERT INTO opening_balances (opening_date, party_id, balance) VALUES (?, ?, ?)",
+                [(opening_date, party_id, balance) for party_id, balance in parties if round(balance, 6)]
+            )
+            conn.executemany(
+                "INSERT INTO opening_balances (opening_date, item_id, quantity, rate) VALUES (?, ?, ?, ?)",
+                [(opening_date, item_id, quantity, rate) for item_id, quantity, rate in items
+                 if round(quantity, 6) or rate is not None]
+            )
+            conn.executemany(
+                "INSERT INTO opening_receivables (party_id, transaction_date, amount) VALUES (?, ?, ?)",
+                receivables
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO storage_settings (key, value) VALUES ('closed_through', ?)",
+                (closing_date,)
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error closing the year: {str(e)}"
+        finally:
+            conn.execute("DETACH DATABASE archive")
+
+        # Give the pages of the moved rows back to the file system
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    # Caches of this process assume rows are only ever added
+    columnar_store.reset_store(path)
+    live_dashboard.reset_totals(path)
+
+    return True, f"Moved {moved} transactions up to {closing_date} to {target}"
+
+def main():
+    """Close a fiscal year of a company database"""
+    if len(sys.argv) > 3:
+        print("usage: python year_end.py [CLOSING_DATE] [COMPANY_FILE]")
+        return 2
+
+    closing_date = sys.argv[1] if len(sys.argv) > 1 else last_fiscal_year_end().isoformat()
+    company_file = sys.argv[2] if len(sys.argv) > 2 else None
+    path = tenants.company_path(company_file)
+    size_before = os.path.getsize(path) if os.path.exists(path) else 0
+    started = time.perf_counter()
+
+    success, message = close_fiscal_year(closing_date, company_file)
+    print(message)
+    if not success:
+        return 1
+
+    print(f"closed {path} in {time.perf_counter() - started:.1f} s: "
+          f"{size_before / 1e6:.1f} MB -> {os.path.getsize(path) / 1e6:.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())